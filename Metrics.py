@@ -0,0 +1,187 @@
+import json
+import os
+import re
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# upper bounds in seconds, from a cached read to a confirmation wait
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)
+
+HASH_PATTERN = re.compile('[0-9A-Fa-f]{64}')
+
+
+def normalize_url_path(url_path):
+	"""Drops the query and replaces transaction hashes so every endpoint maps to one label value."""
+
+	return HASH_PATTERN.sub('{hash}', url_path.split('?')[0])
+
+
+class Histogram:
+	"""Counts of observations per fixed bucket, plus their sum."""
+
+	def __init__(self, buckets=DEFAULT_BUCKETS):
+		self.buckets = buckets
+		self.counts = [0] * (len(buckets) + 1)
+		self.sum = 0.0
+		self.count = 0
+
+	def observe(self, value):
+		self.counts[bisect_left(self.buckets, value)] += 1
+		self.sum += value
+		self.count += 1
+
+	def quantile(self, fraction):
+		"""
+		Returns the upper bound of the bucket holding the given quantile, '+Inf' past the last bucket and None without
+		observations.
+		"""
+
+		if not self.count:
+			return None
+
+		rank = fraction * self.count
+		cumulative = 0
+		for bound, count in zip(self.buckets, self.counts):
+			cumulative += count
+			if cumulative >= rank:
+				return bound
+
+		return '+Inf'
+
+
+class Metrics:
+	"""
+	Counters and latency histograms keyed by name and labels, exported as Prometheus text or JSON.
+	Recording is a dict lookup and a bisect so it can stay on in production; it is not thread safe.
+	"""
+
+	def __init__(self):
+		self.counters = {}
+		self.histograms = {}
+		self.started_at = time.time()
+
+	@staticmethod
+	def _key(name, labels):
+		return name, tuple(sorted(labels.items()))
+
+	def increment(self, name, value=1, **labels):
+		key = self._key(name, labels)
+		self.counters[key] = self.counters.get(key, 0) + value
+
+	def observe(self, name, seconds, **labels):
+		key = self._key(name, labels)
+		histogram = self.histograms.get(key)
+		if not histogram:
+			histogram = self.histograms[key] = Histogram()
+
+		histogram.observe(seconds)
+
+	@contextmanager
+	def time(self, name, **labels):
+		"""Observes the duration of the with block, also when it raises."""
+
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.observe(name, time.perf_counter() - start, **labels)
+
+	def order_event(self, order_info, event, previous_event=None, timestamp=None):
+		"""
+		Returns order_info's lifecycle timestamps with event set to timestamp (now by default).
+		When previous_event was recorded, the time spent between both is observed as order_stage_seconds.
+		"""
+
+		timestamp = timestamp or time.time()
+		lifecycle = {**order_info.get('lifecycle', {}), event: timestamp}
+
+		if previous_event in lifecycle:
+			self.observe('order_stage_seconds', timestamp - lifecycle[previous_event], stage=f'{previous_event}_to_{event}')
+
+		self.increment('order_events_total', event=event)
+		return lifecycle
+
+	def reset(self):
+		self.counters = {}
+		self.histograms = {}
+		self.started_at = time.time()
+
+	@staticmethod
+	def _format_labels(labels, extra=()):
+		labels = tuple(labels) + tuple(extra)
+		if not labels:
+			return ''
+
+		escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for _, value in labels)
+		return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+	def to_prometheus(self):
+		"""Returns every metric in the Prometheus text exposition format."""
+
+		lines = []
+
+		typed = set()
+		for (name, labels), value in sorted(self.counters.items()):
+			if name not in typed:
+				lines.append(f'# TYPE {name} counter')
+				typed.add(name)
+
+			lines.append(f'{name}{self._format_labels(labels)} {value}')
+
+		for (name, labels), histogram in sorted(self.histograms.items()):
+			if name not in typed:
+				lines.append(f'# TYPE {name} histogram')
+				typed.add(name)
+
+			cumulative = 0
+			for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+				cumulative += count
+				lines.append(f'{name}_bucket{self._format_labels(labels, [("le", bound)])} {cumulative}')
+
+			lines.append(f'{name}_sum{self._format_labels(labels)} {histogram.sum}')
+			lines.append(f'{name}_count{self._format_labels(labels)} {histogram.count}')
+
+		return '\n'.join(lines) + '\n'
+
+	def to_json(self):
+		"""Returns counters and histogram summaries (count, sum, mean and bucket quantiles) as a dict."""
+
+		return {
+			'started_at': self.started_at,
+			'dumped_at': time.time(),
+			'counters': [
+				{'name': name, 'labels': dict(labels), 'value': value}
+				for (name, labels), value in sorted(self.counters.items())
+			],
+			'histograms': [
+				{
+					'name': name,
+					'labels': dict(labels),
+					'count': histogram.count,
+					'sum': histogram.sum,
+					'mean': histogram.sum / histogram.count if histogram.count else None,
+					'p50': histogram.quantile(0.5),
+					'p95': histogram.quantile(0.95),
+					'p99': histogram.quantile(0.99),
+					'buckets': dict(zip([str(bound) for bound in histogram.buckets] + ['+Inf'], histogram.counts))
+				}
+				for (name, labels), histogram in sorted(self.histograms.items())
+			]
+		}
+
+	def dump(self, filename):
+		"""Writes Prometheus text to .prom and .txt files and JSON otherwise, replacing filename atomically."""
+
+		temporary_filename = f'{filename}.{os.getpid()}.tmp'
+		with open(temporary_filename, 'w') as file:
+			if filename.endswith(('.prom', '.txt')):
+				file.write(self.to_prometheus())
+			else:
+				json.dump(self.to_json(), file, indent='\t')
+
+		os.replace(temporary_filename, filename)
+
+
+# metrics of this process
+METRICS = Metrics()
@@ -1,20 +1,58 @@
 from symbolchain.CryptoTypes import PublicKey
-from symbolchain.facade.SymbolFacade import SymbolFacade
 from symbolchain.symbol.IdGenerator import generate_mosaic_id
-from symbolchain.sc import Amount
 
+import asyncio
+import copy
 import json
 import random
 
 from PIL import Image
 import io
 
+from Metrics import METRICS
+from TransactionEngine import SignedTransaction, TransactionEngine
+from UploadPlanner import UploadPlanner
+
+# account receiving the image chunk transfers
+NFT_STORAGE_PUBLIC_KEY = '295118813BDE3CCA141AD0AF6DE596BA37FB68FAC1E3FAFF4C794A2443EE910D'
+
+class AnnounceError(Exception):
+	"""Raised after a batch of announces finished with some of them failing."""
+
+	def __init__(self, failures, transaction_hashes, failed_payloads=None):
+		# failures: (index, transaction hash, error) of every failed announce
+		super().__init__(f'{len(failures)} of {len(transaction_hashes)} announces failed')
+		self.failures = failures
+		self.transaction_hashes = transaction_hashes
+
+		# failed_payloads: transaction hash -> signed json payload, announced again as is until its deadline
+		self.failed_payloads = failed_payloads or {}
+
 class TomatoProcess:
-	def __init__(self, client, network, key_pair, fee_multiplier):
+	def __init__(self, client, network, key_pair, fee_multiplier, announce_concurrency=1, engine=None, upload_planner=None):
 		self.client = client
 		self.key_pair = key_pair
 		self.network = network
 		self.fee_multiplier = fee_multiplier
+		self.announce_concurrency = announce_concurrency
+		self.engine = engine or TransactionEngine(network, key_pair, fee_multiplier)
+		self.upload_planner = upload_planner or UploadPlanner()
+
+		# fee of every aggregate signed by this process, by transaction hash
+		self.transaction_fees = {}
+
+	def close(self):
+		self.engine.close()
+
+	def with_fee_multiplier(self, fee_multiplier):
+		"""
+		Returns a process signing with fee_multiplier that shares the client, engine and recorded fees of this one.
+		Stages running concurrently each sign and settle with their own multiplier this way.
+		"""
+
+		process = copy.copy(self)
+		process.fee_multiplier = fee_multiplier
+		return process
 
 	@staticmethod
 	def _image_to_bytes(image_path):
@@ -23,58 +61,107 @@ class TomatoProcess:
 				img.save(output, format=img.format)
 				return output.getvalue()
 
-	@staticmethod
-	def _chunk_data(data, chunk_size=1024):
-		return [data[i:i+chunk_size] for i in range(0, len(data), chunk_size)]
+	async def _announce_all(self, signed_transactions):
+		"""
+		Announce SignedTransaction tuples with at most announce_concurrency requests in flight.
+		Every announce is attempted; failures are reported one by one and raised together as AnnounceError.
+		"""
+		semaphore = asyncio.Semaphore(self.announce_concurrency)
+
+		async def announce(index, transaction_hash, json_payload):
+			async with semaphore:
+				try:
+					response = await self.client.announce(json.loads(json_payload))
+				except Exception as error:
+					print(f'failed to announce transaction {index}: {transaction_hash} ({error})')
+					return index, transaction_hash, error
+
+				# the node answers rejected payloads with an error code instead of raising
+				if isinstance(response, dict) and 'code' in response:
+					print(f'failed to announce transaction {index}: {transaction_hash} ({response})')
+					return index, transaction_hash, response
+
+				return None
+
+		with METRICS.time('workflow_stage_seconds', stage='announce'):
+			results = await asyncio.gather(*[
+				announce(index, transaction_hash, json_payload)
+				for index, (transaction_hash, json_payload, _) in enumerate(signed_transactions)
+			])
+
+		failures = [result for result in results if result]
+		METRICS.increment('transactions_announced_total', len(results) - len(failures))
+		METRICS.increment('transaction_announce_failures_total', len(failures))
+		if failures:
+			raise AnnounceError(
+				failures,
+				[signed_transaction.transaction_hash for signed_transaction in signed_transactions],
+				{signed_transactions[index].transaction_hash: signed_transactions[index].json_payload for index, _, _ in failures})
+
+	async def retry_announces(self, failed_payloads):
+		"""Announces again the payloads of an AnnounceError, raising AnnounceError with those still failing."""
+
+		await self._announce_all([
+			SignedTransaction(transaction_hash, json_payload, None)
+			for transaction_hash, json_payload in failed_payloads.items()
+		])
+
+	async def _build_and_sign(self, deadline, embedded_batches):
+		with METRICS.time('workflow_stage_seconds', stage='sign'):
+			signed_transactions = await self.engine.build_and_sign_aggregates_async(deadline, embedded_batches, self.fee_multiplier)
+
+		METRICS.increment('transactions_signed_total', len(signed_transactions))
+
+		for signed_transaction in signed_transactions:
+			self.transaction_fees[signed_transaction.transaction_hash] = signed_transaction.fee
+
+		return signed_transactions
+
+	def recorded_fees(self, transaction_hashes):
+		"""
+		Returns the fees recorded at signing time for the given transaction hashes and forgets them.
+		The caller persists them with the order, so a long running process does not keep every fee it ever signed.
+		"""
+		return {
+			transaction_hash: self.transaction_fees.pop(transaction_hash)
+			for transaction_hash in transaction_hashes
+			if transaction_hash in self.transaction_fees
+		}
+
+	async def _announce(self, signed_transaction, is_dry_run):
+		if not is_dry_run:
+			with METRICS.time('workflow_stage_seconds', stage='announce'):
+				await self.client.announce(json.loads(signed_transaction.json_payload))
 
-	async def create_mosaic(self, deadline, supply, is_dry_run):
-		facade = SymbolFacade(self.network)
+			METRICS.increment('transactions_announced_total')
 
-		signer_address = facade.network.public_key_to_address(self.key_pair.public_key)
+	async def create_mosaic(self, deadline, supply, is_dry_run):
+		signer_address = self.engine.signer_address
 		nonce = random.randint(0, 1000000000)
 		mosaic_id = generate_mosaic_id(signer_address, nonce)
 
-		mosaic_definition_transaction = facade.transaction_factory.create_embedded({
+		mosaic_definition_transaction = {
 			'type': 'mosaic_definition_transaction_v1',
-			'signer_public_key': self.key_pair.public_key,
 			'duration': 0,
 			'nonce': nonce,
 			'flags': 'transferable',
 			'divisibility': 0
-		})
+		}
 
-		mosaic_supply_change_transaction = facade.transaction_factory.create_embedded({
+		mosaic_supply_change_transaction = {
 			'type': 'mosaic_supply_change_transaction_v1',
-			'signer_public_key': self.key_pair.public_key,
 			'action': 'increase',
 			'mosaic_id': mosaic_id,
 			'delta': supply
-		})
+		}
 
 		embedded_transactions = [mosaic_definition_transaction, mosaic_supply_change_transaction]
 
-		aggregate_transaction = facade.transaction_factory.create({
-				'type': 'aggregate_complete_transaction_v2',
-				'signer_public_key': self.key_pair.public_key,
-				'deadline': deadline.timestamp,
-				'transactions_hash': facade.hash_embedded_transactions(embedded_transactions),
-				'transactions': embedded_transactions
-		})
-
-		aggregate_transaction.fee = Amount(self.fee_multiplier * aggregate_transaction.size)
-
-		signature = facade.sign_transaction(self.key_pair, aggregate_transaction)
-
-		transaction_hash = facade.hash_transaction(aggregate_transaction)
-
-		json_payload = facade.transaction_factory.attach_signature(aggregate_transaction, signature)
-
-		transaction_hash = facade.hash_transaction(aggregate_transaction)
+		[signed_transaction] = await self._build_and_sign(deadline, [embedded_transactions])
 
-		print(f'announcing mosaic creation transaction: {transaction_hash}')
+		print(f'announcing mosaic creation transaction: {signed_transaction.transaction_hash}')
 
-		if not is_dry_run:
-			await self.client.announce(json.loads(json_payload))
+		await self._announce(signed_transaction, is_dry_run)
 
 
 		# The generate_mosaic_id function returns a 64-bit integer,
@@ -82,166 +169,131 @@ class TomatoProcess:
 		# results in only 15 significant digits, as it does not automatically left pad to 16 digits.
 		# To get a 16 digit value with left padding, it is recommended to use a format string like f'0x{mosaic_id:016X}'.
 
-		return str(transaction_hash), f'0x{mosaic_id:016X}'
-
-	async def process_upload_to_chain(self, deadline, image_url, is_dry_run):
-		image_bytes = self._image_to_bytes(image_url)
-		chunks = self._chunk_data(image_bytes)
-
-		facade = SymbolFacade(self.network)
+		return signed_transaction.transaction_hash, f'0x{mosaic_id:016X}'
 
-		nft_storage_address = facade.network.public_key_to_address(PublicKey('295118813BDE3CCA141AD0AF6DE596BA37FB68FAC1E3FAFF4C794A2443EE910D'))
+	def _chunk_transfers(self, batches):
+		nft_storage_address = self.engine.facade.network.public_key_to_address(PublicKey(NFT_STORAGE_PUBLIC_KEY))
 
-		transfer_txs = []
+		# garush reads the image back by concatenating the messages of the aggregates in order
+		return [
+			[
+				{
+					'type': 'transfer_transaction_v1',
+					'recipient_address': nft_storage_address,
+					'mosaics': [],
+					'message': chunk
+				}
+				for chunk in batch
+			]
+			for batch in batches
+		]
 
-		for chunk in chunks:
-			transfer_transaction = facade.transaction_factory.create_embedded({
-				'type': 'transfer_transaction_v1',
-				'signer_public_key': self.key_pair.public_key,
-				'recipient_address': nft_storage_address,
-				'mosaics': [],
-				'message': chunk
-			})
+	async def process_upload_to_chain(self, deadline, image, is_dry_run):
+		# image is either the encoded image bytes or a path to an image file
+		image_bytes = image if isinstance(image, (bytes, bytearray)) else self._image_to_bytes(image)
+		upload_plan = self.upload_planner.plan(image_bytes, self.fee_multiplier)
 
-			transfer_txs.append(transfer_transaction)
+		print(
+			f'upload plan: {len(image_bytes)} bytes in {sum(len(batch) for batch in upload_plan.batches)} transfers,'
+			f' {len(upload_plan.batches)} aggregates, predicted fee {sum(upload_plan.fees)}')
 
-		# Split the transactions into chunks of 100 (for inner txs)
-		prepare_tx = self._chunk_data(transfer_txs, 100)
+		signed_transactions = await self._build_and_sign(deadline, self._chunk_transfers(upload_plan.batches))
 
-		transaction_hashes = []
+		for signed_transaction in signed_transactions:
+			print(f'announcing storage image on chain transaction: {signed_transaction.transaction_hash}')
 
-		for tx in prepare_tx:
-			embedded_transactions = tx
-
-			aggregate_transaction = facade.transaction_factory.create({
-					'type': 'aggregate_complete_transaction_v2',
-					'signer_public_key': self.key_pair.public_key,
-					'deadline': deadline.timestamp,
-					'transactions_hash': facade.hash_embedded_transactions(embedded_transactions),
-					'transactions': embedded_transactions,
-			})
+		if not is_dry_run:
+			await self._announce_all(signed_transactions)
 
-			aggregate_transaction.fee = Amount(self.fee_multiplier * aggregate_transaction.size)
+		return [signed_transaction.transaction_hash for signed_transaction in signed_transactions]
 
-			signature = facade.sign_transaction(self.key_pair, aggregate_transaction)
+	async def resign_upload(self, deadline, image_bytes, aggregate_indexes, is_dry_run):
+		"""
+		Signs again the aggregates at aggregate_indexes of the upload of image_bytes and announces them.
+		Returns their new hashes in the order of aggregate_indexes; AnnounceError carries them too.
+		"""
 
-			json_payload = facade.transaction_factory.attach_signature(aggregate_transaction, signature)
+		upload_plan = self.upload_planner.plan(image_bytes, self.fee_multiplier)
+		batches = [upload_plan.batches[index] for index in aggregate_indexes]
 
-			transaction_hash = facade.hash_transaction(aggregate_transaction)
+		signed_transactions = await self._build_and_sign(deadline, self._chunk_transfers(batches))
 
-			print(f'announcing storage image on chain transaction: {transaction_hash}')
-			if not is_dry_run:
-				await self.client.announce(json.loads(json_payload))
+		for signed_transaction in signed_transactions:
+			print(f'announcing storage image on chain transaction again: {signed_transaction.transaction_hash}')
 
-			transaction_hashes.append(str(transaction_hash))
+		if not is_dry_run:
+			await self._announce_all(signed_transactions)
 
-		return transaction_hashes
+		return [signed_transaction.transaction_hash for signed_transaction in signed_transactions]
 
 	async def process_image_container(self, deadline, garush_meta, image_hashes, is_dry_run):
-		facade = SymbolFacade(self.network)
-
-		nft_folder_address = facade.network.public_key_to_address(PublicKey('9135DC8F377740631CB8B2F26235D533F06294751A398F9B45B0CD20920C82CD'))
+		nft_folder_address = self.engine.facade.network.public_key_to_address(PublicKey('9135DC8F377740631CB8B2F26235D533F06294751A398F9B45B0CD20920C82CD'))
 
-		transfer_transaction_garush_meta = facade.transaction_factory.create_embedded({
+		transfer_transaction_garush_meta = {
 			'type': 'transfer_transaction_v1',
-			'signer_public_key': self.key_pair.public_key,
 			'recipient_address': nft_folder_address,
 			'mosaics': [],
 			'message': b'\0' + f"{garush_meta}".encode()
-		})
+		}
 
-		transfer_transaction_image_container = facade.transaction_factory.create_embedded({
+		transfer_transaction_image_container = {
 			'type': 'transfer_transaction_v1',
-			'signer_public_key': self.key_pair.public_key,
 			'recipient_address': nft_folder_address,
 			'mosaics': [],
 			'message': b'\0' + f"{image_hashes}".encode()
-		})
+		}
 
 		embedded_transactions = [transfer_transaction_garush_meta, transfer_transaction_image_container]
 
-		aggregate_transaction = facade.transaction_factory.create({
-				'type': 'aggregate_complete_transaction_v2',
-				'signer_public_key': self.key_pair.public_key,
-				'deadline': deadline.timestamp,
-				'transactions_hash': facade.hash_embedded_transactions(embedded_transactions),
-				'transactions': embedded_transactions,
-		})
-
-		aggregate_transaction.fee = Amount(self.fee_multiplier * aggregate_transaction.size)
-
-		signature = facade.sign_transaction(self.key_pair, aggregate_transaction)
+		[signed_transaction] = await self._build_and_sign(deadline, [embedded_transactions])
 
-		json_payload = facade.transaction_factory.attach_signature(aggregate_transaction, signature)
+		print(f'announcing image container on chain transaction: {signed_transaction.transaction_hash}')
 
-		transaction_hash = facade.hash_transaction(aggregate_transaction)
+		await self._announce(signed_transaction, is_dry_run)
 
-		print(f'announcing image container on chain transaction: {transaction_hash}')
-		if not is_dry_run:
-			await self.client.announce(json.loads(json_payload))
-
-		return str(transaction_hash)
+		return signed_transaction.transaction_hash
 
 	async def process_settlement(self, deadline, nft_mosaic_id, mosaic_metadata, mosaics, buyer_address, is_dry_run):
-		facade = SymbolFacade(self.network)
-
-		signer_address = facade.network.public_key_to_address(self.key_pair.public_key)
+		signer_address = self.engine.signer_address
 
 		# create mosaic metadata
-		mosaic_metadata_transaction = facade.transaction_factory.create_embedded({
+		mosaic_metadata_transaction = {
 			'type': 'mosaic_metadata_transaction_v1',
-			'signer_public_key': self.key_pair.public_key,
 			'target_address': signer_address,
 			'target_mosaic_id': nft_mosaic_id,
 			'scoped_metadata_key': int.from_bytes(b'tomatina', byteorder='little'),
 			'value_size_delta': len(mosaic_metadata),
 			'value': mosaic_metadata,
-		})
+		}
 
 		# create mosaic transfer include NFT and remaining balance
-		transfer_transaction_mosaic = facade.transaction_factory.create_embedded({
+		transfer_transaction_mosaic = {
 			'type': 'transfer_transaction_v1',
-			'signer_public_key': self.key_pair.public_key,
 			'recipient_address': buyer_address,
 			'mosaics': mosaics,
 			'message': b'\0Thank you for your purchase!'
-		})
+		}
 
 		embedded_transactions = [mosaic_metadata_transaction, transfer_transaction_mosaic]
 
-		aggregate_transaction = facade.transaction_factory.create({
-				'type': 'aggregate_complete_transaction_v2',
-				'signer_public_key': self.key_pair.public_key,
-				'deadline': deadline.timestamp,
-				'transactions_hash': facade.hash_embedded_transactions(embedded_transactions),
-				'transactions': embedded_transactions
-		})
-
-		aggregate_transaction.fee = Amount(self.fee_multiplier * aggregate_transaction.size)
-
-		signature = facade.sign_transaction(self.key_pair, aggregate_transaction)
+		[signed_transaction] = await self._build_and_sign(deadline, [embedded_transactions])
 
-		transaction_hash = facade.hash_transaction(aggregate_transaction)
+		print(f'announcing settlement transaction: {signed_transaction.transaction_hash}')
 
-		json_payload = facade.transaction_factory.attach_signature(aggregate_transaction, signature)
-
-		transaction_hash = facade.hash_transaction(aggregate_transaction)
-
-		print(f'announcing settlement transaction: {transaction_hash}')
-
-		if not is_dry_run:
-			await self.client.announce(json.loads(json_payload))
+		await self._announce(signed_transaction, is_dry_run)
 
-		return str(transaction_hash)
+		return signed_transaction.transaction_hash
 
-	async def get_total_transaction_fees(self, transaction_hashes):
-		transaction_hashes_payload = {"transactionIds": transaction_hashes}
+	async def get_transaction_fees(self, transaction_hashes, batch_size=100):
+		"""Looks up the fees of confirmed transactions in bulk requests of at most batch_size hashes."""
+		fees = {}
 
-		response = await self.client.transactions_confirmed(transaction_hashes_payload)
+		for i in range(0, len(transaction_hashes), batch_size):
+			transaction_hashes_payload = {"transactionIds": transaction_hashes[i:i + batch_size]}
 
-		fees = 0
+			response = await self.client.transactions_confirmed(transaction_hashes_payload)
 
-		for transaction in response:
-			fees += int(transaction['transaction']['maxFee'])
+			for transaction in response:
+				fees[transaction['meta']['hash']] = int(transaction['transaction']['maxFee'])
 
 		return fees
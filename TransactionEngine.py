@@ -0,0 +1,134 @@
+import asyncio
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from symbolchain.facade.SymbolFacade import SymbolFacade
+from symbolchain.sc import Amount
+
+SignedTransaction = namedtuple('SignedTransaction', ['transaction_hash', 'json_payload', 'fee'])
+
+# engine of a pool worker process, created once by _init_worker
+_worker_engine = None
+
+
+def _init_worker(network, private_key, fee_multiplier):
+	global _worker_engine
+
+	facade = SymbolFacade(network)
+	_worker_engine = TransactionEngine(network, facade.KeyPair(private_key), fee_multiplier, max_workers=1)
+
+
+def _picklable(embedded_descriptors):
+	# memoryview messages cannot be sent to a worker process
+	return [
+		{**descriptor, 'message': bytes(descriptor['message'])} if isinstance(descriptor.get('message'), memoryview) else descriptor
+		for descriptor in embedded_descriptors
+	]
+
+
+def _build_and_sign_in_worker(deadline, embedded_descriptors, fee_multiplier):
+	return _worker_engine.build_and_sign_aggregate(deadline, embedded_descriptors, fee_multiplier)
+
+
+class TransactionEngine:
+	"""Builds, signs and hashes aggregate transactions with a single shared facade."""
+
+	def __init__(self, network, key_pair, fee_multiplier, max_workers=None, parallel_threshold=4):
+		"""
+		Creates an engine signing with key_pair.
+		Batches of at least parallel_threshold aggregates (about 100 KB of image per aggregate) are signed in a pool of
+		max_workers processes (one per core by default), started on first use and kept until close.
+		Four aggregates is the smallest batch two workers sign faster than one process, pool start included
+		(python -m benchmarks.run --suites sign).
+		"""
+
+		self.network = network
+		self.facade = SymbolFacade(network)
+		self.key_pair = key_pair
+		self.fee_multiplier = fee_multiplier
+		self.max_workers = max_workers or os.cpu_count()
+		self.parallel_threshold = parallel_threshold
+
+		self._executor = None
+
+	@property
+	def signer_address(self):
+		return self.facade.network.public_key_to_address(self.key_pair.public_key)
+
+	def build_and_sign_aggregate(self, deadline, embedded_descriptors, fee_multiplier=None):
+		"""
+		Builds one aggregate complete transaction from embedded transaction descriptors and signs it.
+		The fee uses fee_multiplier when given and the engine's fee_multiplier otherwise.
+		"""
+
+		embedded_transactions = [
+			self.facade.transaction_factory.create_embedded({
+				'signer_public_key': self.key_pair.public_key,
+				**descriptor
+			})
+			for descriptor in embedded_descriptors
+		]
+
+		aggregate_transaction = self.facade.transaction_factory.create({
+			'type': 'aggregate_complete_transaction_v2',
+			'signer_public_key': self.key_pair.public_key,
+			'deadline': deadline,
+			'transactions_hash': self.facade.hash_embedded_transactions(embedded_transactions),
+			'transactions': embedded_transactions
+		})
+
+		fee = (self.fee_multiplier if fee_multiplier is None else fee_multiplier) * aggregate_transaction.size
+		aggregate_transaction.fee = Amount(fee)
+
+		signature = self.facade.sign_transaction(self.key_pair, aggregate_transaction)
+
+		json_payload = self.facade.transaction_factory.attach_signature(aggregate_transaction, signature)
+
+		transaction_hash = self.facade.hash_transaction(aggregate_transaction)
+
+		return SignedTransaction(str(transaction_hash), json_payload, fee)
+
+	def _uses_pool(self, embedded_batches):
+		return 1 < self.max_workers and len(embedded_batches) >= self.parallel_threshold
+
+	def _pool_arguments(self, deadline, embedded_batches, fee_multiplier):
+		if not self._executor:
+			initargs = (self.network, self.key_pair.private_key, self.fee_multiplier)
+			self._executor = ProcessPoolExecutor(self.max_workers, initializer=_init_worker, initargs=initargs)
+
+		fee_multiplier = self.fee_multiplier if fee_multiplier is None else fee_multiplier
+		return [(deadline.timestamp, _picklable(batch), fee_multiplier) for batch in embedded_batches]
+
+	def build_and_sign_aggregates(self, deadline, embedded_batches, fee_multiplier=None):
+		"""
+		Builds and signs one aggregate per batch of embedded transaction descriptors.
+		Returns SignedTransaction tuples in batch order.
+		"""
+
+		if not self._uses_pool(embedded_batches):
+			return [self.build_and_sign_aggregate(deadline.timestamp, batch, fee_multiplier) for batch in embedded_batches]
+
+		arguments = self._pool_arguments(deadline, embedded_batches, fee_multiplier)
+		futures = [self._executor.submit(_build_and_sign_in_worker, *batch_arguments) for batch_arguments in arguments]
+		return [future.result() for future in futures]
+
+	async def build_and_sign_aggregates_async(self, deadline, embedded_batches, fee_multiplier=None):
+		"""Same as build_and_sign_aggregates, the event loop keeps running while the pool signs."""
+
+		if not self._uses_pool(embedded_batches):
+			return self.build_and_sign_aggregates(deadline, embedded_batches, fee_multiplier)
+
+		arguments = self._pool_arguments(deadline, embedded_batches, fee_multiplier)
+		loop = asyncio.get_running_loop()
+		return list(await asyncio.gather(*[
+			loop.run_in_executor(self._executor, _build_and_sign_in_worker, *batch_arguments)
+			for batch_arguments in arguments
+		]))
+
+	def close(self):
+		"""Stops the signing processes, a later batch starts them again."""
+
+		if self._executor:
+			self._executor.shutdown()
+			self._executor = None
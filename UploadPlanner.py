@@ -0,0 +1,100 @@
+from collections import namedtuple
+
+# protocol limits of mainnet and testnet (plugins.transfer.maxMessageSize, plugins.aggregate.maxTransactionsPerAggregate)
+MAX_MESSAGE_SIZE = 1024
+MAX_TRANSACTIONS_PER_AGGREGATE = 100
+
+# aggregate complete v2 without cosignatures: entity header (128) + transactions hash (32) + payload size and reserved (8)
+AGGREGATE_HEADER_SIZE = 168
+
+# embedded entity header (48) + recipient (24) + message size (2) + mosaics count (1) + reserved (5), without mosaics
+EMBEDDED_TRANSFER_HEADER_SIZE = 80
+
+# embedded transactions are padded to this alignment inside an aggregate
+EMBEDDED_ALIGNMENT = 8
+
+# batches: memoryview chunks of each aggregate in upload order, sizes and fees: predicted per aggregate
+UploadPlan = namedtuple('UploadPlan', ['batches', 'sizes', 'fees'])
+
+
+def aligned_size(size):
+	return (size + EMBEDDED_ALIGNMENT - 1) // EMBEDDED_ALIGNMENT * EMBEDDED_ALIGNMENT
+
+
+class UploadPlanner:
+	"""
+	Splits data into transfer messages grouped into aggregates, with the fewest transactions and then the lowest fee.
+	Messages keep the data order, so concatenating the messages of the aggregates in order gives the data back.
+	"""
+
+	def __init__(
+		self,
+		max_message_size=MAX_MESSAGE_SIZE,
+		max_transactions_per_aggregate=MAX_TRANSACTIONS_PER_AGGREGATE,
+		max_aggregate_size=None
+	):
+		self.max_message_size = max_message_size
+		self.max_transactions_per_aggregate = max_transactions_per_aggregate
+		self.max_aggregate_size = max_aggregate_size
+
+	@staticmethod
+	def transfer_size(message_size):
+		"""Returns the size a transfer carrying message_size bytes adds to an aggregate, padding included."""
+
+		return aligned_size(EMBEDDED_TRANSFER_HEADER_SIZE + message_size)
+
+	def message_sizes(self, data_size):
+		"""
+		Returns the message sizes covering data_size bytes with the fewest transfers.
+		Messages are cut at the largest aligned size when that needs no extra transfer, so only the last one is padded.
+		"""
+
+		if 0 == data_size:
+			return []
+
+		message_count = -(-data_size // self.max_message_size)
+
+		chunk_size = self.max_message_size
+		aligned_chunk_size = self.max_message_size // EMBEDDED_ALIGNMENT * EMBEDDED_ALIGNMENT
+		if aligned_chunk_size and message_count == -(-data_size // aligned_chunk_size):
+			chunk_size = aligned_chunk_size
+
+		return [min(chunk_size, data_size - offset) for offset in range(0, data_size, chunk_size)]
+
+	def _group(self, message_sizes):
+		# next fit is optimal here, transfers cannot be reordered
+		groups = []
+		aggregate_size = 0
+		for message_size in message_sizes:
+			transfer_size = self.transfer_size(message_size)
+			is_full = groups and (
+				len(groups[-1]) == self.max_transactions_per_aggregate
+				or (self.max_aggregate_size and aggregate_size + transfer_size > self.max_aggregate_size))
+
+			if not groups or is_full:
+				groups.append([])
+				aggregate_size = AGGREGATE_HEADER_SIZE
+
+			groups[-1].append(message_size)
+			aggregate_size += transfer_size
+
+		return groups
+
+	def plan(self, data, fee_multiplier):
+		"""Returns the UploadPlan of data, slicing it without copies, with fees predicted for fee_multiplier."""
+
+		view = memoryview(data)
+
+		batches = []
+		sizes = []
+		offset = 0
+		for group in self._group(self.message_sizes(len(view))):
+			batch = []
+			for message_size in group:
+				batch.append(view[offset:offset + message_size])
+				offset += message_size
+
+			batches.append(batch)
+			sizes.append(AGGREGATE_HEADER_SIZE + sum(self.transfer_size(message_size) for message_size in group))
+
+		return UploadPlan(batches, sizes, [fee_multiplier * size for size in sizes])
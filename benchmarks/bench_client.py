@@ -0,0 +1,58 @@
+import argparse
+import asyncio
+import time
+
+from client.SymbolClient import SymbolClient
+
+from .mock_node import MockSymbolNode
+
+
+async def run_fresh_sessions(endpoint, requests):
+	start = time.perf_counter()
+	for _ in range(requests):
+		async with SymbolClient(endpoint) as client:
+			await client.height()
+
+	return time.perf_counter() - start
+
+
+async def run_pooled_session(endpoint, requests):
+	start = time.perf_counter()
+	async with SymbolClient(endpoint) as client:
+		for _ in range(requests):
+			await client.height()
+
+		latency_stats = client.latency_stats()
+
+	return time.perf_counter() - start, latency_stats
+
+
+async def main():
+	parser = argparse.ArgumentParser(description='compare a session per request with one pooled session')
+	parser.add_argument('--requests', help='number of chain/info requests', type=int, default=500)
+	parser.add_argument('--latency', help='latency injected by the mock node in seconds', type=float, default=0.0)
+
+	args = parser.parse_args()
+
+	node = MockSymbolNode(args.latency)
+	endpoint = await node.start()
+
+	try:
+		fresh_seconds = await run_fresh_sessions(endpoint, args.requests)
+		fresh_connections = node.connection_count
+
+		node.peers.clear()
+		pooled_seconds, latency_stats = await run_pooled_session(endpoint, args.requests)
+		pooled_connections = node.connection_count
+	finally:
+		await node.stop()
+
+	print(f'requests: {args.requests}')
+	print(f'session per request: {fresh_seconds:.3f}s, {fresh_connections} connections')
+	print(f'pooled session: {pooled_seconds:.3f}s, {pooled_connections} connections')
+	print(f'speedup: {fresh_seconds / pooled_seconds:.2f}x')
+	print(f'latency: {latency_stats}')
+
+
+if '__main__' == __name__:
+	asyncio.run(main())
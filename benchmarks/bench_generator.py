@@ -0,0 +1,60 @@
+import argparse
+import glob
+import os
+import random
+import tempfile
+import time
+
+from PIL import Image, ImageChops
+
+from generator import LayerCache, generate_images_nft
+
+# same stacking order as process_order
+LAYER_FOLDERS = ['legs', 'body', 'arm-left', 'arm-right', 'eyes', 'mouth', 'stem']
+
+
+def random_layer_stacks(art_source, count, seed):
+	choices = [sorted(glob.glob(os.path.join(art_source, folder, '*.png'))) for folder in LAYER_FOLDERS]
+	rng = random.Random(seed)
+	return [[rng.choice(files) for files in choices] for _ in range(count)]
+
+
+def run(stacks, output_folder, cache):
+	start = time.perf_counter()
+	for index, filenames in enumerate(stacks):
+		generate_images_nft(filenames, os.path.join(output_folder, f'{index}.png'), cache)
+
+	return time.perf_counter() - start
+
+
+def main():
+	parser = argparse.ArgumentParser(description='compare cached and uncached art generation')
+	parser.add_argument('--art-source', help='art source folder', default='art_source')
+	parser.add_argument('--orders', help='number of orders to render', type=int, default=200)
+	parser.add_argument('--seed', help='seed used to pick layer combinations', type=int, default=2023)
+
+	args = parser.parse_args()
+
+	stacks = random_layer_stacks(args.art_source, args.orders, args.seed)
+
+	with tempfile.TemporaryDirectory() as uncached_folder, tempfile.TemporaryDirectory() as cached_folder:
+		uncached_seconds = run(stacks, uncached_folder, None)
+
+		cache = LayerCache()
+		cached_seconds = run(stacks, cached_folder, cache)
+
+		for index in range(len(stacks)):
+			with Image.open(os.path.join(uncached_folder, f'{index}.png')) as expected:
+				with Image.open(os.path.join(cached_folder, f'{index}.png')) as actual:
+					if ImageChops.difference(expected, actual).getbbox() is not None:
+						raise RuntimeError(f'cached render of order {index} differs from Image.open render')
+
+	print(f'orders: {args.orders}')
+	print(f'Image.open per call: {uncached_seconds:.3f}s ({args.orders / uncached_seconds:.1f} orders/s)')
+	print(f'layer cache: {cached_seconds:.3f}s ({args.orders / cached_seconds:.1f} orders/s)')
+	print(f'speedup: {uncached_seconds / cached_seconds:.2f}x')
+	print(f'cache: {cache.stats()}')
+
+
+if '__main__' == __name__:
+	main()
@@ -0,0 +1,75 @@
+import argparse
+import asyncio
+import time
+
+from client.SymbolClient import SymbolClient
+
+from .mock_node import MockSymbolNode
+
+
+def percentile(sorted_values, fraction):
+	return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+async def run_reads(endpoints, requests, hedge_after=None):
+	latencies = []
+	async with SymbolClient(endpoints, hedge_after=hedge_after) as client:
+		for _ in range(requests):
+			start = time.perf_counter()
+			await client.height()
+			latencies.append(time.perf_counter() - start)
+
+		node_stats = client.node_stats()
+
+	latencies.sort()
+	return {
+		'total_seconds': sum(latencies),
+		'p50': percentile(latencies, 0.5),
+		'p95': percentile(latencies, 0.95),
+		'p99': percentile(latencies, 0.99),
+		'max': latencies[-1]
+	}, node_stats
+
+
+def print_run(name, summary, nodes):
+	print(f'{name}: total {summary["total_seconds"]:.3f}s', ', '.join(
+		f'{key} {summary[key] * 1000:.1f}ms' for key in ('p50', 'p95', 'p99', 'max')))
+	print('  reads per node:', [node.request_counts.get('GET /chain/info', 0) for node in nodes])
+
+	for node in nodes:
+		node.request_counts.clear()
+
+
+async def main():
+	parser = argparse.ArgumentParser(description='compare a single node with a latency ranked and hedged node pool')
+	parser.add_argument('--requests', help='number of chain/info reads per run', type=int, default=300)
+	parser.add_argument('--hedge-after', help='seconds before a read is hedged to the next node', type=float, default=0.02)
+
+	args = parser.parse_args()
+
+	# a slow node, a fast node with a heavy tail and a steady node
+	nodes = [
+		MockSymbolNode(latency=0.05),
+		MockSymbolNode(latency=0.002, slow_latency=0.2, slow_fraction=0.05),
+		MockSymbolNode(latency=0.01)
+	]
+	endpoints = [await node.start() for node in nodes]
+
+	try:
+		summary, _ = await run_reads(endpoints[:1], args.requests)
+		print_run('single slow node', summary, nodes)
+
+		summary, _ = await run_reads(endpoints, args.requests)
+		print_run('node pool', summary, nodes)
+
+		summary, node_stats = await run_reads(endpoints, args.requests, args.hedge_after)
+		print_run(f'node pool hedged after {args.hedge_after * 1000:.0f}ms', summary, nodes)
+		for endpoint, stats in node_stats.items():
+			print(f'  {endpoint}: {stats}')
+	finally:
+		for node in nodes:
+			await node.stop()
+
+
+if '__main__' == __name__:
+	asyncio.run(main())
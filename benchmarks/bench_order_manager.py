@@ -0,0 +1,88 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from order.OrderManager import OrderManager, OrderStatus
+from order.OrderStore import JsonOrderStore, SqliteOrderStore
+
+
+def synthetic_order(index, rng):
+	statuses = [OrderStatus.COMPLETED] * 8 + [OrderStatus.PENDING_SETTLEMENT, OrderStatus.PENDING_IMAGE_CONTAINER]
+	return {
+		"message": ','.join(str(rng.randint(0, 8)) for _ in range(6)),
+		"order_hash": f'{index:064X}',
+		"buyer_address": 'TBUYERADDRESSXXXXXXXXXXXXXXXXXXXXXXXXXXX',
+		"paid": 70000000,
+		"mosaic_hash": f'{rng.getrandbits(256):064X}',
+		"mosaic_id": f'0x{rng.getrandbits(64):016X}',
+		"mosaic_supply": 1,
+		"image_hash": [f'{rng.getrandbits(256):064X}' for _ in range(1)],
+		"image_size": 33000,
+		"image_container_hash": f'{rng.getrandbits(256):064X}',
+		"settlement_hash": "",
+		"order_status": rng.choice(statuses)
+	}
+
+
+def measure(operation, repeat):
+	start = time.perf_counter()
+	for _ in range(repeat):
+		operation()
+
+	return (time.perf_counter() - start) / repeat
+
+
+def bench_store(name, order_manager, order_count, operations, rng):
+	order_ids = [rng.randint(1, order_count) for _ in range(operations)]
+	order_hashes = [f'{order_id - 1:064X}' for order_id in order_ids]
+
+	results = {
+		'get_order': measure(lambda: order_manager.get_order(order_ids.pop()), operations),
+		'get_order_by_hash': measure(lambda: order_manager.get_order_by_hash(order_hashes.pop()), operations),
+		'update_order': measure(
+			lambda: order_manager.update_order(rng.randint(1, order_count), {'order_status': OrderStatus.COMPLETED}),
+			operations),
+		'add_order': measure(lambda: order_manager.add_order(synthetic_order(order_count, rng)), operations),
+		'pending_settlement': measure(order_manager.get_pending_settlement_orders, operations)
+	}
+
+	print(f'{name} ({order_count} orders):')
+	for operation_name, seconds in results.items():
+		print(f'  {operation_name}: {seconds * 1000:.3f} ms/op')
+
+	return results
+
+
+def main():
+	parser = argparse.ArgumentParser(description='compare json and sqlite order stores')
+	parser.add_argument('--orders', help='order counts to benchmark', type=int, nargs='+', default=[10000, 100000])
+	parser.add_argument('--operations', help='operations timed per store', type=int, default=20)
+	parser.add_argument('--seed', help='seed used for synthetic orders', type=int, default=2023)
+
+	args = parser.parse_args()
+
+	for order_count in args.orders:
+		rng = random.Random(args.seed)
+		orders = [{**synthetic_order(index, rng), 'order_id': index + 1} for index in range(order_count)]
+
+		with tempfile.TemporaryDirectory() as folder:
+			json_store = JsonOrderStore(os.path.join(folder, 'order.json'))
+			json_store.save_to_json(orders)
+			json_results = bench_store('json', OrderManager(store=json_store), order_count, args.operations, random.Random(args.seed))
+
+			sqlite_store = SqliteOrderStore(os.path.join(folder, 'order.db'))
+			start = time.perf_counter()
+			sqlite_store.migrate_from_json(json_store.filename)
+			print(f'migration: {time.perf_counter() - start:.3f} s')
+
+			sqlite_results = bench_store('sqlite', OrderManager(store=sqlite_store), order_count, args.operations, random.Random(args.seed))
+			sqlite_store.close()
+
+		for operation_name, seconds in json_results.items():
+			print(f'  {operation_name} speedup: {seconds / sqlite_results[operation_name]:.1f}x')
+
+
+if '__main__' == __name__:
+	main()
@@ -0,0 +1,74 @@
+import argparse
+import asyncio
+import json
+import time
+
+from symbolchain.CryptoTypes import PrivateKey
+from symbolchain.facade.SymbolFacade import SymbolFacade
+from symbolchain.symbol.Network import NetworkTimestamp
+
+from client.SymbolClient import SymbolClient
+from TransactionEngine import TransactionEngine
+
+from .mock_node import MockSymbolNode
+from .run import BENCHMARK_PRIVATE_KEY
+
+
+def signed_payloads(count):
+	facade = SymbolFacade('testnet')
+	engine = TransactionEngine('testnet', facade.KeyPair(PrivateKey(BENCHMARK_PRIVATE_KEY)), 100, max_workers=1)
+	embedded_batches = [
+		[{'type': 'transfer_transaction_v1', 'recipient_address': engine.signer_address, 'mosaics': [], 'message': f'{index}'}]
+		for index in range(count)
+	]
+
+	return [
+		json.loads(signed_transaction.json_payload)
+		for signed_transaction in engine.build_and_sign_aggregates(NetworkTimestamp(1), embedded_batches)
+	]
+
+
+async def announce_burst(endpoint, payloads, **kwargs):
+	async with SymbolClient(endpoint, **kwargs) as client:
+		start = time.perf_counter()
+		results = await asyncio.gather(*(client.announce(payload) for payload in payloads), return_exceptions=True)
+		elapsed = time.perf_counter() - start
+
+		failures = sum(1 for result in results if isinstance(result, BaseException))
+		return elapsed, failures, client.rate_limit_stats()
+
+
+async def main():
+	parser = argparse.ArgumentParser(description='announce a burst against a rate limited and flaky mock node')
+	parser.add_argument('--announces', help='number of concurrent announces', type=int, default=500)
+	parser.add_argument('--rate-limit', help='requests per second accepted by the mock node', type=int, default=200)
+	parser.add_argument('--error-fraction', help='fraction of requests failing with 503', type=float, default=0.05)
+	parser.add_argument('--latency', help='latency injected by the mock node in seconds', type=float, default=0.01)
+
+	args = parser.parse_args()
+
+	payloads = signed_payloads(args.announces)
+	runs = [
+		('no retries', {'max_retries': 0}),
+		('retries', {'max_retries': 5}),
+		('retries and token bucket', {'max_retries': 5, 'requests_per_second': args.rate_limit * 0.9})
+	]
+
+	for name, kwargs in runs:
+		node = MockSymbolNode(latency=args.latency, error_fraction=args.error_fraction, rate_limit=args.rate_limit)
+		endpoint = await node.start()
+		try:
+			elapsed, failures, stats = await announce_burst(endpoint, payloads, **kwargs)
+		finally:
+			await node.stop()
+
+		succeeded = args.announces - failures
+		concurrency = next(iter(stats.pop('concurrency').values()))
+		print(f'{name}: {succeeded}/{args.announces} announced in {elapsed:.2f}s ({succeeded / elapsed:.0f}/s)')
+		print(f'  node answered: {node.status_counts}, requests: {sum(node.request_counts.values())}')
+		print(f'  client: {stats}')
+		print(f'  concurrency: {concurrency}')
+
+
+if '__main__' == __name__:
+	asyncio.run(main())
@@ -0,0 +1,271 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import tempfile
+import time
+
+from symbolchain.CryptoTypes import PrivateKey
+from symbolchain.facade.SymbolFacade import SymbolFacade
+
+from order.CheckPoint import CheckPoint
+from order.OrderManager import OrderStatus
+from workflows.context import (
+	WorkflowContext,
+	add_common_arguments,
+	add_confirmation_arguments,
+	add_order_arguments,
+	create_client
+)
+from workflows.pipeline import run_stage
+from workflows.process_image_container import process_image_containers
+from workflows.process_order import process_orders
+from workflows.process_settlement import process_settlements
+
+from .mock_node import MockSymbolNode
+from .run import BENCHMARK_PRIVATE_KEY
+
+ORDER_PAYMENT = 70000000
+
+# order lifecycle stages, each ends when the order is first seen in its status
+LIFECYCLE_STAGES = (
+	('order', None, OrderStatus.PENDING_IMAGE_CONTAINER),
+	('image_container', OrderStatus.PENDING_IMAGE_CONTAINER, OrderStatus.PENDING_SETTLEMENT),
+	('settlement', OrderStatus.PENDING_SETTLEMENT, OrderStatus.COMPLETED),
+	('total', None, OrderStatus.COMPLETED)
+)
+
+
+def percentiles(values):
+	if not values:
+		return None
+
+	values = sorted(values)
+	return {
+		'count': len(values),
+		'p50': values[int(0.5 * (len(values) - 1))],
+		'p95': values[int(0.95 * (len(values) - 1))],
+		'p99': values[int(0.99 * (len(values) - 1))],
+		'max': values[-1]
+	}
+
+
+def timed(stage, durations):
+	async def run(context):
+		start = time.perf_counter()
+		try:
+			await stage(context)
+		finally:
+			durations.append(time.perf_counter() - start)
+
+	return run
+
+
+async def inject_orders(node, order_address, orders, order_rate, injected_at, seed, combinations=0):
+	"""
+	Adds orders transfers paying for random art, all at once or order_rate per second.
+	With combinations set, the art is picked among that many distinct combinations so images repeat.
+	"""
+
+	rng = random.Random(seed)
+	facade = SymbolFacade('testnet')
+	buyers = [facade.KeyPair(PrivateKey(rng.randbytes(32))).public_key for _ in range(16)]
+
+	def random_art():
+		return ','.join(str(rng.randint(0, 8)) for _ in range(6))
+
+	art_pool = [random_art() for _ in range(combinations)]
+
+	for index in range(orders):
+		message = rng.choice(art_pool) if art_pool else random_art()
+		transaction_hash = node.inject_transfer(rng.choice(buyers), order_address, message, ORDER_PAYMENT)
+		injected_at[transaction_hash] = time.perf_counter()
+
+		if order_rate and index < orders - 1:
+			await asyncio.sleep(1 / order_rate)
+
+
+async def watch_orders(order_manager, injected_at, seen_at, orders, stop_event, poll_interval):
+	"""Records when every order is first seen in each status and stops the run once all of them completed."""
+
+	while not stop_event.is_set():
+		now = time.perf_counter()
+		for order in order_manager.all_orders():
+			seen_at.setdefault(order['order_hash'], {}).setdefault(order['order_status'], now)
+
+		completed = sum(1 for statuses in seen_at.values() if OrderStatus.COMPLETED in statuses)
+		if completed == orders and len(injected_at) == orders:
+			stop_event.set()
+			return
+
+		await asyncio.sleep(poll_interval)
+
+
+def lifecycle_latencies(injected_at, seen_at):
+	latencies = {name: [] for name, _, _ in LIFECYCLE_STAGES}
+
+	for order_hash, statuses in seen_at.items():
+		for name, start_status, end_status in LIFECYCLE_STAGES:
+			start = injected_at.get(order_hash) if start_status is None else statuses.get(start_status)
+			if start is not None and end_status in statuses:
+				latencies[name].append(statuses[end_status] - start)
+
+	return {name: percentiles(values) for name, values in latencies.items()}
+
+
+def workflow_arguments(args, endpoint, order_address, folder):
+	parser = argparse.ArgumentParser()
+	add_common_arguments(parser)
+	add_order_arguments(parser)
+	add_confirmation_arguments(parser)
+
+	return parser.parse_args([
+		'--symbol-node', endpoint,
+		'--network', 'testnet',
+		'--order-address', str(order_address),
+		'--private-key', BENCHMARK_PRIVATE_KEY,
+		'--order-file', os.path.join(folder, f'order.{args.order_store}'),
+		'--node-cache-file', os.path.join(folder, 'node_metadata.json'),
+		'--check-point-file', os.path.join(folder, 'last_check_point.json'),
+		'--confirmation-cache-file', os.path.join(folder, 'confirmed_hashes.json'),
+		'--image-index-file', os.path.join(folder, 'image_index.json'),
+		'--upload-retry-file', os.path.join(folder, 'upload_retries.json'),
+		'--art-generated-path', folder,
+		'--render-workers', str(args.render_workers),
+		'--announce-fanout', '1'
+	])
+
+
+async def run_load(args, folder):
+	node = MockSymbolNode(
+		latency=args.latency,
+		error_fraction=args.error_fraction,
+		block_time=args.block_time,
+		confirmation_delay=args.confirmation_delay)
+	endpoint = await node.start()
+
+	facade = SymbolFacade('testnet')
+	order_address = facade.network.public_key_to_address(facade.KeyPair(PrivateKey(BENCHMARK_PRIVATE_KEY)).public_key)
+	workflow_args = workflow_arguments(args, endpoint, order_address, folder)
+
+	# process_order expects an existing check point
+	CheckPoint(workflow_args.check_point_file).save_to_json({'last_offset_id': None})
+
+	injected_at = {}
+	seen_at = {}
+	stage_durations = {'order': [], 'image container': [], 'settlement': []}
+	stop_event = asyncio.Event()
+
+	try:
+		async with create_client(workflow_args) as client:
+			with WorkflowContext(workflow_args, client) as context:
+				confirmation_tracker = context.confirmation_tracker
+				image_container_wake = confirmation_tracker.add_listener()
+				settlement_wake = confirmation_tracker.add_listener()
+				if not args.no_websocket:
+					confirmation_tracker.start_listening(order_address)
+
+				start = time.perf_counter()
+				stages = [
+					run_stage('order', timed(process_orders, stage_durations['order']), context, args.interval, stop_event),
+					run_stage(
+						'image container',
+						timed(process_image_containers, stage_durations['image container']),
+						context,
+						args.interval,
+						stop_event,
+						image_container_wake),
+					run_stage(
+						'settlement',
+						timed(process_settlements, stage_durations['settlement']),
+						context,
+						args.interval,
+						stop_event,
+						settlement_wake),
+					inject_orders(node, order_address, args.orders, args.order_rate, injected_at, args.seed, args.combinations),
+					watch_orders(context.order_manager, injected_at, seen_at, args.orders, stop_event, args.poll_interval)
+				]
+
+				# stage output is noise at this volume
+				with contextlib.redirect_stdout(io.StringIO()) if not args.verbose else contextlib.nullcontext():
+					try:
+						await asyncio.wait_for(asyncio.gather(*stages), args.timeout)
+					except asyncio.TimeoutError:
+						stop_event.set()
+
+				elapsed = time.perf_counter() - start
+				await confirmation_tracker.stop_listening()
+
+				client_stats = {'latency': client.latency_stats(), 'rate_limit': client.rate_limit_stats()}
+	finally:
+		await node.stop()
+
+	completed = sum(1 for statuses in seen_at.values() if OrderStatus.COMPLETED in statuses)
+	return {
+		'orders': args.orders,
+		'completed': completed,
+		'elapsed_seconds': elapsed,
+		'orders_per_minute': completed * 60 / elapsed,
+		'lifecycle_seconds': lifecycle_latencies(injected_at, seen_at),
+		'stage_run_seconds': {name: percentiles(durations) for name, durations in stage_durations.items()},
+		'node_requests': dict(sorted(node.request_counts.items())),
+		'node_errors': node.status_counts,
+		'blocks': node.height - 1,
+		'client': client_stats
+	}
+
+
+def print_results(results):
+	print(f'completed {results["completed"]}/{results["orders"]} orders in {results["elapsed_seconds"]:.1f}s'
+		f' ({results["orders_per_minute"]:.1f} orders/min, {results["blocks"]} blocks)')
+
+	for title, stages in (('order lifecycle', results['lifecycle_seconds']), ('stage runs', results['stage_run_seconds'])):
+		print(f'{title}:')
+		for name, stats in stages.items():
+			if stats:
+				print(f'  {name}: n={stats["count"]}', ', '.join(f'{key} {stats[key]:.3f}s' for key in ('p50', 'p95', 'p99', 'max')))
+
+	print('node requests:')
+	for key, count in results['node_requests'].items():
+		print(f'  {key}: {count}')
+
+	if results['node_errors']:
+		print(f'node errors: {results["node_errors"]}')
+
+
+async def main():
+	parser = argparse.ArgumentParser(description='drive the order, image container and settlement stages against a mock node')
+	parser.add_argument('--orders', help='number of synthetic orders', type=int, default=50)
+	parser.add_argument('--combinations', help='distinct art combinations ordered, every order random when 0', type=int, default=0)
+	parser.add_argument('--order-rate', help='orders injected per second, all at once when 0', type=float, default=0)
+	parser.add_argument('--latency', help='latency injected by the mock node in seconds', type=float, default=0.005)
+	parser.add_argument('--error-fraction', help='fraction of node requests failing with 503', type=float, default=0.0)
+	parser.add_argument('--block-time', help='seconds between mock blocks', type=float, default=1.0)
+	parser.add_argument('--confirmation-delay', help='seconds before an announced transaction can be confirmed', type=float, default=0.0)
+	parser.add_argument('--interval', help='seconds between runs of each stage', type=float, default=1.0)
+	parser.add_argument('--poll-interval', help='seconds between order store checks of the driver', type=float, default=0.1)
+	parser.add_argument('--order-store', help='order file type', choices=['json', 'db'], default='json')
+	parser.add_argument('--render-workers', help='number of processes rendering images', type=int, default=os.cpu_count())
+	parser.add_argument('--no-websocket', help='poll for confirmations instead of listening on the node websocket', action='store_true')
+	parser.add_argument('--timeout', help='seconds before the run is stopped', type=float, default=600)
+	parser.add_argument('--seed', help='seed used for synthetic orders', type=int, default=2023)
+	parser.add_argument('--output', help='file to write the results to as JSON')
+	parser.add_argument('--verbose', help='show the output of the stages', action='store_true')
+
+	args = parser.parse_args()
+
+	with tempfile.TemporaryDirectory() as folder:
+		results = await run_load(args, folder)
+
+	print_results(results)
+
+	if args.output:
+		with open(args.output, 'w') as file:
+			json.dump({'arguments': vars(args), **results}, file, indent='\t')
+
+
+if '__main__' == __name__:
+	asyncio.run(main())
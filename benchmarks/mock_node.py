@@ -0,0 +1,320 @@
+import asyncio
+import random
+import time
+import uuid
+from binascii import hexlify, unhexlify
+from collections import deque
+from urllib.parse import parse_qs
+
+from aiohttp import web
+from symbolchain.facade.SymbolFacade import SymbolFacade
+from symbolchain.sc import TransactionFactory
+
+# testnet nemesis epoch used by NetworkTimestamp (2022-10-31 21:07:47 UTC) in milliseconds
+EPOCH_MILLISECONDS = 1667250467000
+
+CURRENCY_MOSAIC_ID = 0x72C0212E67A08BCE
+TRANSFER_TRANSACTION_TYPE = 16724
+
+
+class MockSymbolNode:
+	"""
+	Local stand-in for the Symbol REST endpoints used by SymbolClient, simulating a testnet chain.
+
+	Announced transactions are confirmed by the next block produced at least confirmation_delay seconds later, blocks are
+	produced every block_time seconds (or by produce_block). Incoming transfers are added with inject_transfer.
+	"""
+
+	def __init__(
+		self,
+		latency=0.0,
+		slow_latency=0.0,
+		slow_fraction=0.0,
+		error_fraction=0.0,
+		rate_limit=None,
+		block_time=None,
+		confirmation_delay=0.0
+	):
+		"""
+		Creates a node that delays every response by latency seconds, and slow_fraction of them by slow_latency.
+		It fails error_fraction of the requests with 503 and answers 429 beyond rate_limit requests per second.
+		"""
+
+		self.latency = latency
+		self.slow_latency = slow_latency
+		self.slow_fraction = slow_fraction
+		self.error_fraction = error_fraction
+		self.rate_limit = rate_limit
+		self.block_time = block_time
+		self.confirmation_delay = confirmation_delay
+		self.status_counts = {}
+		self._recent_requests = deque()
+		self.height = 1
+		self.request_counts = {}
+		self.peers = set()
+		self.websockets = {}
+		self._runner = None
+		self._block_task = None
+		self.endpoint = None
+
+		self.facade = SymbolFacade('testnet')
+
+		# hash -> (announce time, signer address, transaction json) until a block confirms it
+		self.unconfirmed = {}
+
+		# hash -> {'transaction', 'meta'} like the transactions/confirmed endpoint returns them
+		self.confirmed = {}
+
+		# incoming transfers returned by transactions/confirmed queries, in id order
+		self.transfers = []
+
+		self.app = web.Application(middlewares=[self._middleware])
+		self.app.add_routes([
+			web.get('/ws', self.websocket),
+			web.get('/chain/info', self.chain_info),
+			web.get('/node/time', self.node_time),
+			web.get('/node/info', self.node_info),
+			web.get('/network/properties', self.network_properties),
+			web.get('/network/fees/transaction', self.transaction_fees),
+			web.get('/transactions/confirmed', self.confirmed_transactions),
+			web.get('/transactions/confirmed/{transaction_hash}', self.confirmed_transaction),
+			web.post('/transactions/confirmed', self.confirmed_transactions_by_hash),
+			web.post('/transactionStatus', self.transaction_statuses),
+			web.put('/transactions', self.announce)
+		])
+
+	@web.middleware
+	async def _middleware(self, request, handler):
+		key = f'{request.method} {request.path}'
+		self.request_counts[key] = self.request_counts.get(key, 0) + 1
+
+		# every distinct client port is a separate TCP connection
+		self.peers.add(request.transport.get_extra_info('peername'))
+
+		if self.rate_limit:
+			now = time.monotonic()
+			while self._recent_requests and self._recent_requests[0] < now - 1:
+				self._recent_requests.popleft()
+
+			if len(self._recent_requests) >= self.rate_limit:
+				return self._error_response(429)
+
+			self._recent_requests.append(now)
+
+		if self.error_fraction and random.random() < self.error_fraction:
+			return self._error_response(503)
+
+		latency = self.latency
+		if self.slow_fraction and random.random() < self.slow_fraction:
+			latency = self.slow_latency
+
+		if latency:
+			await asyncio.sleep(latency)
+
+		return await handler(request)
+
+	def _error_response(self, status):
+		self.status_counts[status] = self.status_counts.get(status, 0) + 1
+		return web.json_response({'code': 'Internal', 'message': 'mock node error'}, status=status)
+
+	@property
+	def connection_count(self):
+		return len(self.peers)
+
+	async def start(self, host='127.0.0.1', port=0):
+		"""Starts serving and producing blocks, returns the endpoint url."""
+
+		self._runner = web.AppRunner(self.app)
+		await self._runner.setup()
+		site = web.TCPSite(self._runner, host, port)
+		await site.start()
+
+		if self.block_time:
+			self._block_task = asyncio.create_task(self._produce_blocks())
+
+		port = self._runner.addresses[0][1]
+		self.endpoint = f'http://{host}:{port}'
+		return self.endpoint
+
+	async def stop(self):
+		if self._block_task:
+			self._block_task.cancel()
+			self._block_task = None
+
+		for websocket in list(self.websockets):
+			await websocket.close()
+
+		if self._runner:
+			await self._runner.cleanup()
+			self._runner = None
+
+	@staticmethod
+	def network_timestamp():
+		return int(time.time() * 1000) - EPOCH_MILLISECONDS
+
+	async def _produce_blocks(self):
+		while True:
+			await asyncio.sleep(self.block_time)
+			await self.produce_block()
+
+	async def produce_block(self):
+		"""Adds a block confirming every announced transaction older than confirmation_delay."""
+
+		self.height += 1
+
+		now = time.monotonic()
+		ready = [
+			transaction_hash for transaction_hash, (announced_at, _, _) in self.unconfirmed.items()
+			if now - announced_at >= self.confirmation_delay
+		]
+
+		for transaction_hash in ready:
+			_, signer_address, transaction = self.unconfirmed.pop(transaction_hash)
+			confirmed = {'transaction': transaction, 'meta': {'hash': transaction_hash, 'height': str(self.height)}}
+			self.confirmed[transaction_hash] = confirmed
+			await self.publish(f'confirmedAdded/{signer_address}', confirmed)
+
+	def inject_transfer(self, signer_public_key, recipient_address, message, amount, mosaic_id=CURRENCY_MOSAIC_ID):
+		"""Adds a confirmed transfer with a plain text message at the current height and time and returns its hash."""
+
+		transaction_hash = f'{random.getrandbits(256):064X}'
+		self.transfers.append({
+			'id': f'{len(self.transfers) + 1:024X}',
+			'meta': {'hash': transaction_hash, 'height': str(self.height), 'timestamp': str(self.network_timestamp())},
+			'transaction': {
+				'type': TRANSFER_TRANSACTION_TYPE,
+				'signerPublicKey': str(signer_public_key),
+				'recipientAddress': str(recipient_address),
+				'message': hexlify(b'\0' + message.encode('utf8')).decode('utf8').upper(),
+				'mosaics': [{'id': f'{mosaic_id:016X}', 'amount': str(amount)}]
+			}
+		})
+		return transaction_hash
+
+	async def websocket(self, request):
+		websocket = web.WebSocketResponse()
+		await websocket.prepare(request)
+
+		uid = uuid.uuid4().hex
+		self.websockets[websocket] = set()
+		await websocket.send_json({'uid': uid})
+
+		async for message in websocket:
+			subscription = message.json()
+			if uid == subscription.get('uid') and 'subscribe' in subscription:
+				self.websockets[websocket].add(subscription['subscribe'])
+
+		del self.websockets[websocket]
+		return websocket
+
+	async def publish(self, topic, data):
+		"""Sends data to every WebSocket subscribed to topic."""
+
+		for websocket, topics in list(self.websockets.items()):
+			if topic in topics:
+				await websocket.send_json({'topic': topic, 'data': data})
+
+	async def publish_confirmed(self, address, transaction_hash):
+		self.height += 1
+		confirmed = {'transaction': {}, 'meta': {'hash': transaction_hash, 'height': str(self.height)}}
+		self.confirmed[transaction_hash] = confirmed
+		await self.publish(f'confirmedAdded/{address}', confirmed)
+
+	async def chain_info(self, _):
+		return web.json_response({'height': str(self.height)})
+
+	async def node_time(self, _):
+		timestamp = str(self.network_timestamp())
+		return web.json_response({'communicationTimestamps': {'sendTimestamp': timestamp, 'receiveTimestamp': timestamp}})
+
+	async def node_info(self, _):
+		return web.json_response({'networkIdentifier': 152})
+
+	async def network_properties(self, _):
+		formatted_mosaic_id = f'{CURRENCY_MOSAIC_ID:016X}'
+		formatted_mosaic_id = '\''.join(formatted_mosaic_id[i:i + 4] for i in range(0, 16, 4))
+		return web.json_response({'chain': {'currencyMosaicId': f'0x{formatted_mosaic_id}'}})
+
+	async def transaction_fees(self, _):
+		return web.json_response({'medianFeeMultiplier': 100})
+
+	def is_confirmed(self, transaction_hash):
+		return transaction_hash.upper() in self.confirmed
+
+	async def confirmed_transactions(self, request):
+		"""Serves incoming transfers with the recipientAddress, transferMosaicId, fromTransferAmount and offset filters."""
+
+		query = {name: values[0] for name, values in parse_qs(request.query_string).items()}
+		page_size = int(query.get('pageSize', 10))
+		offset = query.get('offset')
+		mosaic_id = query.get('transferMosaicId')
+		from_amount = int(query.get('fromTransferAmount', 0))
+
+		def matches(transfer):
+			transaction = transfer['transaction']
+			if query.get('recipientAddress') not in (None, transaction['recipientAddress']):
+				return False
+
+			if offset and transfer['id'] <= offset:
+				return False
+
+			if mosaic_id:
+				return any(mosaic_id == mosaic['id'] and int(mosaic['amount']) >= from_amount for mosaic in transaction['mosaics'])
+
+			return True
+
+		data = []
+		for transfer in self.transfers:
+			if len(data) == page_size:
+				break
+
+			if matches(transfer):
+				data.append(transfer)
+
+		return web.json_response({'data': data, 'pagination': {'pageNumber': 1, 'pageSize': page_size}})
+
+	async def confirmed_transaction(self, request):
+		confirmed = self.confirmed.get(request.match_info['transaction_hash'].upper())
+		if not confirmed:
+			return web.json_response({'code': 'ResourceNotFound', 'message': 'no resource exists'}, status=404)
+
+		return web.json_response(confirmed)
+
+	async def confirmed_transactions_by_hash(self, request):
+		request_json = await request.json()
+		return web.json_response([
+			self.confirmed[transaction_hash.upper()]
+			for transaction_hash in request_json['transactionIds'] if transaction_hash.upper() in self.confirmed
+		])
+
+	async def transaction_statuses(self, request):
+		request_json = await request.json()
+
+		statuses = []
+		for transaction_hash in request_json['hashes']:
+			if self.is_confirmed(transaction_hash):
+				statuses.append({'group': 'confirmed', 'hash': transaction_hash, 'code': 'Success'})
+			elif transaction_hash.upper() in self.unconfirmed:
+				statuses.append({'group': 'unconfirmed', 'hash': transaction_hash, 'code': 'Success'})
+
+		return web.json_response(statuses)
+
+	async def announce(self, request):
+		request_json = await request.json()
+
+		try:
+			transaction = TransactionFactory.deserialize(unhexlify(request_json['payload']))
+		except (KeyError, ValueError):
+			return web.json_response({'code': 'InvalidContent', 'message': 'payload is not a transaction'}, status=400)
+
+		transaction_hash = str(self.facade.hash_transaction(transaction))
+		if transaction_hash not in self.confirmed:
+			signer_address = self.facade.network.public_key_to_address(transaction.signer_public_key)
+			self.unconfirmed.setdefault(transaction_hash, (time.monotonic(), str(signer_address), {
+				'signerPublicKey': str(transaction.signer_public_key),
+				'type': transaction.type_.value,
+				'maxFee': str(transaction.fee.value),
+				'size': transaction.size
+			}))
+
+		return web.json_response({'message': 'packet 9 was pushed to the network via /transactions'}, status=202)
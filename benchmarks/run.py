@@ -0,0 +1,282 @@
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+
+import PIL
+from PIL import Image
+from symbolchain.CryptoTypes import PrivateKey, PublicKey
+from symbolchain.facade.SymbolFacade import SymbolFacade
+from symbolchain.symbol.Network import NetworkTimestamp
+
+from generator import LayerCache, art_layers, encode_png, generate_images_nft, render_image_bytes
+from order.OrderManager import OrderManager
+from order.OrderStore import JsonOrderStore, SqliteOrderStore
+from TomatoProcess import NFT_STORAGE_PUBLIC_KEY, TomatoProcess
+from TransactionEngine import TransactionEngine
+from UploadPlanner import UploadPlanner
+
+from .bench_order_manager import synthetic_order
+
+SUITES = ('render', 'chunk', 'sign', 'orders')
+
+# fixed key so signing work is identical between runs, never used on a network
+BENCHMARK_PRIVATE_KEY = '0' * 63 + '1'
+
+
+def time_operation(operation, repeat, warmup=1):
+	"""Runs operation warmup + repeat times and returns timing statistics of the timed runs in seconds."""
+
+	for _ in range(warmup):
+		operation()
+
+	samples = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		operation()
+		samples.append(time.perf_counter() - start)
+
+	return {
+		'repeat': repeat,
+		'min_seconds': min(samples),
+		'median_seconds': statistics.median(samples),
+		'mean_seconds': statistics.fmean(samples),
+		'max_seconds': max(samples)
+	}
+
+
+def random_image_codes(count, seed):
+	rng = random.Random(seed)
+	return [[rng.randint(1, 9) for _ in range(6)] for _ in range(count)]
+
+
+def noise_png(size_bytes, seed):
+	"""Returns a PNG of random RGBA pixels, which barely compresses, of roughly size_bytes."""
+
+	side = max(1, int((size_bytes / 4) ** 0.5))
+	image = Image.frombytes('RGBA', (side, side), random.Random(seed).randbytes(side * side * 4))
+
+	with io.BytesIO() as output:
+		image.save(output, format='PNG')
+		return output.getvalue()
+
+
+def bench_render(args):
+	layer_stacks = [art_layers(image_code, args.art_source) for image_code in random_image_codes(args.images, args.seed)]
+	results = {}
+
+	with tempfile.TemporaryDirectory() as folder:
+		def generate_all(cache):
+			for index, filenames in enumerate(layer_stacks):
+				generate_images_nft(filenames, os.path.join(folder, f'{index}.png'), cache)
+
+		results['generate_images_nft_uncached'] = time_operation(lambda: generate_all(None), args.repeat)
+		results['generate_images_nft_cached'] = time_operation(lambda: generate_all(LayerCache()), args.repeat)
+
+	cache = LayerCache()
+	results['render_image_bytes_warm_cache'] = time_operation(
+		lambda: [render_image_bytes(filenames, cache=cache) for filenames in layer_stacks],
+		args.repeat)
+
+	with Image.open(os.path.join(args.art_source, 'body', 'body.png')) as image:
+		image.load()
+		results['encode_png'] = time_operation(lambda: encode_png(image), args.repeat)
+		results['encode_png_optimized'] = time_operation(lambda: encode_png(image, optimize=True), args.repeat)
+
+	for name, result in results.items():
+		result['images'] = 1 if name.startswith('encode_png') else len(layer_stacks)
+
+	return results
+
+
+def bench_chunk(args):
+	planner = UploadPlanner()
+	results = {}
+
+	with tempfile.TemporaryDirectory() as folder:
+		for size_kb in args.image_sizes:
+			image_bytes = noise_png(size_kb * 1024, args.seed)
+			image_path = os.path.join(folder, f'{size_kb}.png')
+			with open(image_path, 'wb') as file:
+				file.write(image_bytes)
+
+			results[f'image_to_bytes_{size_kb}kb'] = {
+				**time_operation(lambda: TomatoProcess._image_to_bytes(image_path), args.repeat),
+				'bytes': len(image_bytes)
+			}
+
+			upload_plan = planner.plan(image_bytes, 100)
+			results[f'plan_upload_{size_kb}kb'] = {
+				**time_operation(lambda: planner.plan(image_bytes, 100), args.repeat),
+				'bytes': len(image_bytes),
+				'transfers': sum(len(batch) for batch in upload_plan.batches),
+				'aggregates': len(upload_plan.batches),
+				'predicted_fee': sum(upload_plan.fees)
+			}
+
+	return results
+
+
+def bench_sign(args):
+	facade = SymbolFacade('testnet')
+	key_pair = facade.KeyPair(PrivateKey(BENCHMARK_PRIVATE_KEY))
+	engine = TransactionEngine('testnet', key_pair, 100, max_workers=1)
+	recipient_address = facade.network.public_key_to_address(PublicKey(NFT_STORAGE_PUBLIC_KEY))
+	deadline = NetworkTimestamp(1)
+	planner = UploadPlanner()
+	results = {}
+
+	for size_kb in args.image_sizes:
+		# same embedded transfers as process_upload_to_chain
+		upload_plan = planner.plan(noise_png(size_kb * 1024, args.seed), engine.fee_multiplier)
+		embedded_batches = [
+			[
+				{'type': 'transfer_transaction_v1', 'recipient_address': recipient_address, 'mosaics': [], 'message': chunk}
+				for chunk in batch
+			]
+			for batch in upload_plan.batches
+		]
+
+		signed_transactions = engine.build_and_sign_aggregates(deadline, embedded_batches)
+		results[f'build_and_sign_{size_kb}kb'] = {
+			**time_operation(lambda: engine.build_and_sign_aggregates(deadline, embedded_batches), args.repeat),
+			'aggregates': len(embedded_batches),
+			'embedded_transactions': sum(len(batch) for batch in embedded_batches),
+			'predicted_fee': sum(upload_plan.fees),
+			'signed_fee': sum(signed_transaction.fee for signed_transaction in signed_transactions)
+		}
+
+		# the same batches in the signing pool, the first run starts the workers; compare with the serial run above
+		# to choose TransactionEngine parallel_threshold
+		pooled_engine = TransactionEngine('testnet', key_pair, 100, max_workers=args.sign_workers, parallel_threshold=1)
+		start = time.perf_counter()
+		pooled_engine.build_and_sign_aggregates(deadline, embedded_batches)
+		cold_seconds = time.perf_counter() - start
+
+		results[f'build_and_sign_pooled_{size_kb}kb'] = {
+			**time_operation(lambda: pooled_engine.build_and_sign_aggregates(deadline, embedded_batches), args.repeat, warmup=0),
+			'aggregates': len(embedded_batches),
+			'workers': args.sign_workers,
+			'cold_seconds': cold_seconds
+		}
+		pooled_engine.close()
+
+	return results
+
+
+def bench_orders(args):
+	results = {}
+
+	for order_count in args.order_counts:
+		rng = random.Random(args.seed)
+		orders = [{**synthetic_order(index, rng), 'order_id': index + 1} for index in range(order_count)]
+
+		with tempfile.TemporaryDirectory() as folder:
+			json_store = JsonOrderStore(os.path.join(folder, 'order.json'))
+			json_store.save_to_json(orders)
+
+			sqlite_store = SqliteOrderStore(os.path.join(folder, 'order.db'))
+			sqlite_store.migrate_from_json(json_store.filename)
+
+			for name, store in (('json', json_store), ('sqlite', sqlite_store)):
+				order_manager = OrderManager(store=store)
+				rng = random.Random(args.seed)
+
+				operations = {
+					'get_order': lambda: order_manager.get_order(rng.randint(1, order_count)),
+					'get_order_by_hash': lambda: order_manager.get_order_by_hash(f'{rng.randrange(order_count):064X}'),
+					'update_order': lambda: order_manager.update_order(rng.randint(1, order_count), {'settlement_hash': 'AB'}),
+					'add_order': lambda: order_manager.add_order(synthetic_order(order_count, rng)),
+					'pending_settlement': order_manager.get_pending_settlement_orders
+				}
+
+				for operation_name, operation in operations.items():
+					results[f'{name}_{operation_name}_{order_count}'] = time_operation(operation, args.repeat)
+
+			sqlite_store.close()
+
+	return results
+
+
+def git_commit():
+	try:
+		return subprocess.run(
+			['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def compare(results, baseline_filename):
+	"""Prints the median time ratio of every benchmark also present in the baseline results file."""
+
+	with open(baseline_filename, 'r') as file:
+		baseline = json.load(file)
+
+	print(f'compared with {baseline_filename} ({baseline["metadata"].get("commit")}):')
+	for suite, benchmarks in results['suites'].items():
+		for name, result in benchmarks.items():
+			baseline_result = baseline['suites'].get(suite, {}).get(name)
+			if baseline_result:
+				ratio = result['median_seconds'] / baseline_result['median_seconds']
+				print(f'  {suite}.{name}: {ratio:.2f}x {"slower" if ratio > 1 else "faster"}')
+
+
+def main():
+	parser = argparse.ArgumentParser(description='offline micro-benchmarks of rendering, transaction building and order storage')
+	parser.add_argument('--suites', help='suites to run', nargs='+', choices=SUITES, default=list(SUITES))
+	parser.add_argument('--art-source', help='art source folder', default='art_source')
+	parser.add_argument('--images', help='layer combinations rendered per run', type=int, default=20)
+	parser.add_argument('--image-sizes', help='image sizes in KB for chunking and signing', type=int, nargs='+', default=[50, 100, 200])
+	parser.add_argument('--sign-workers', help='processes of the pooled signing benchmark', type=int, default=os.cpu_count())
+	parser.add_argument('--order-counts', help='order counts of the order store files', type=int, nargs='+', default=[1000, 10000, 100000])
+	parser.add_argument('--repeat', help='timed runs per benchmark', type=int, default=5)
+	parser.add_argument('--seed', help='seed used for all generated inputs', type=int, default=2023)
+	parser.add_argument('--output', help='results file, benchmarks/results/<time>-<commit>.json by default')
+	parser.add_argument('--compare', help='results file of an earlier run to compare with')
+
+	args = parser.parse_args()
+
+	suite_functions = {'render': bench_render, 'chunk': bench_chunk, 'sign': bench_sign, 'orders': bench_orders}
+
+	started_at = datetime.datetime.now(datetime.timezone.utc)
+	results = {
+		'metadata': {
+			'commit': git_commit(),
+			'started_at': started_at.isoformat(),
+			'python': platform.python_version(),
+			'platform': platform.platform(),
+			'pillow': PIL.__version__,
+			'cpu_count': os.cpu_count(),
+			'arguments': vars(args)
+		},
+		'suites': {}
+	}
+
+	for suite in args.suites:
+		print(f'running {suite}')
+		results['suites'][suite] = suite_functions[suite](args)
+
+		for name, result in results['suites'][suite].items():
+			print(f'  {name}: median {result["median_seconds"] * 1000:.3f} ms, min {result["min_seconds"] * 1000:.3f} ms')
+
+	output = args.output or os.path.join(
+		'benchmarks', 'results', f'{started_at:%Y%m%dT%H%M%S}-{results["metadata"]["commit"] or "unknown"}.json')
+	os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+	with open(output, 'w') as file:
+		json.dump(results, file, indent='\t')
+
+	print(f'results written to {output}')
+
+	if args.compare:
+		compare(results, args.compare)
+
+
+if '__main__' == __name__:
+	main()
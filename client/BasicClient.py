@@ -1,36 +1,295 @@
-from aiohttp import ClientSession
+import asyncio
+import random
+import time
+
+from aiohttp import ClientConnectionError, ClientResponseError, ClientSession, ClientTimeout, TCPConnector
+
+from client.NodePool import NodePool
+from client.RateLimiter import AimdLimiter, TokenBucket
+from Metrics import METRICS, normalize_url_path
 
 
 class BasicClient:
-	"""Async client for connecting to a node."""
+	"""Async client for connecting to one node or a pool of nodes."""
 
-	def __init__(self, endpoint):
-		"""Creates a client around an endpoint."""
+	def __init__(
+		self,
+		endpoint,
+		hedge_after=None,
+		announce_fanout=1,
+		requests_per_second=None,
+		max_concurrency=64,
+		latency_target=None,
+		max_retries=3,
+		retry_base_delay=0.2,
+		retry_max_delay=10,
+		connection_limit=100,
+		connection_limit_per_host=0,
+		keepalive_timeout=30,
+		dns_cache_ttl=300,
+		timeout=30
+	):
+		"""
+		Creates a client around an endpoint, or a list of them, with a pooled connector (0 means unlimited for the limits).
+		Reads hedge to the next node after hedge_after seconds when set, announces go to announce_fanout nodes.
 
-		self.endpoint = endpoint
+		Requests to each node are paced by a token bucket of requests_per_second (unlimited when None) and bounded by an
+		AIMD concurrency limit of up to max_concurrency, backing off on 429/5xx and latencies above latency_target.
+		Failed requests are retried up to max_retries times with jittered exponential delays.
+		"""
+
+		self.endpoints = [endpoint] if isinstance(endpoint, str) else list(endpoint)
+		self.endpoint = self.endpoints[0]
+		self.node_pool = NodePool(self.endpoints)
+		self.hedge_after = hedge_after
+		self.announce_fanout = announce_fanout
 		self.network = None
-		self._network_properties = None
 
-	async def get(self, url_path, property_name):
-		"""Initiates a GET to the specified path and returns the desired property."""
+		self._limiters = {
+			endpoint: (
+				TokenBucket(requests_per_second) if requests_per_second else None,
+				AimdLimiter(max_limit=max_concurrency, latency_target=latency_target))
+			for endpoint in self.endpoints
+		}
+		self.max_retries = max_retries
+		self.retry_base_delay = retry_base_delay
+		self.retry_max_delay = retry_max_delay
+		self.retry_stats = {'retries': 0, 'gave_up': 0, 'rate_limited': 0, 'server_errors': 0, 'connection_errors': 0}
 
-		async with ClientSession() as session:
-			async with session.get(f'{self.endpoint}/{url_path}') as response:
-				response_json = await response.json()
-				return response_json if property_name is None else response_json[property_name]
+		self.connection_limit = connection_limit
+		self.connection_limit_per_host = connection_limit_per_host
+		self.keepalive_timeout = keepalive_timeout
+		self.dns_cache_ttl = dns_cache_ttl
+		self.timeout = timeout
+
+		self._session = None
+		self.request_stats = {}
+
+	async def __aenter__(self):
+		self._get_session()
+		return self
+
+	async def __aexit__(self, exc_type, exc_value, traceback):
+		await self.close()
+
+	def _get_session(self):
+		if not self._session or self._session.closed:
+			connector = TCPConnector(
+				limit=self.connection_limit,
+				limit_per_host=self.connection_limit_per_host,
+				keepalive_timeout=self.keepalive_timeout,
+				ttl_dns_cache=self.dns_cache_ttl)
+			self._session = ClientSession(connector=connector, timeout=ClientTimeout(total=self.timeout))
+
+		return self._session
+
+	async def close(self):
+		"""Closes the pooled session and all its connections."""
+
+		if self._session and not self._session.closed:
+			await self._session.close()
+
+		self._session = None
+
+	def _record_latency(self, method, url_path, elapsed, outcome='ok'):
+		path = normalize_url_path(url_path)
+		METRICS.observe('symbol_client_request_seconds', elapsed, method=method, path=path)
+		METRICS.increment('symbol_client_requests_total', method=method, path=path, outcome=outcome)
+
+		key = f'{method} {path}'
+		stats = self.request_stats.setdefault(key, {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+		stats['count'] += 1
+		stats['total_seconds'] += elapsed
+		stats['max_seconds'] = max(stats['max_seconds'], elapsed)
+
+	def latency_stats(self):
+		"""Gets request count and latency per method and path."""
+
+		return {
+			key: {**stats, 'mean_seconds': stats['total_seconds'] / stats['count']}
+			for key, stats in self.request_stats.items()
+		}
+
+	def node_stats(self):
+		"""Gets the rolling latency, error rate and health of each node."""
+
+		return self.node_pool.stats()
+
+	def rate_limit_stats(self):
+		"""Gets throttling, retry and concurrency limit counters."""
+
+		buckets = [bucket for bucket, _ in self._limiters.values() if bucket]
+		return {
+			**self.retry_stats,
+			'throttled_requests': sum(bucket.throttled_requests for bucket in buckets),
+			'throttled_seconds': sum(bucket.throttled_seconds for bucket in buckets),
+			'concurrency': {endpoint: limiter.stats() for endpoint, (_, limiter) in self._limiters.items()}
+		}
+
+	def websocket(self, url_path='ws'):
+		"""Opens a WebSocket to the best ranked node over the pooled session, for use with async with."""
+
+		endpoint = self.node_pool.best().replace('http', 'ws', 1)
+		return self._get_session().ws_connect(f'{endpoint}/{url_path}', heartbeat=30)
+
+	async def _request(self, endpoint, method, url_path, request=None):
+		bucket, limiter = self._limiters[endpoint]
+
+		queued = time.perf_counter()
+		if bucket:
+			await bucket.acquire()
+
+		await limiter.acquire()
+
+		start = time.perf_counter()
+		METRICS.observe('symbol_client_queue_seconds', start - queued, method=method)
+
+		succeeded = False
+		cancelled = False
+		overloaded = False
+		outcome = 'error'
+		try:
+			async with self._get_session().request(method, f'{endpoint}/{url_path}', json=request) as response:
+				if 429 == response.status or response.status >= 500:
+					overloaded = True
+					outcome = f'http_{response.status}'
+					self.retry_stats['rate_limited' if 429 == response.status else 'server_errors'] += 1
+					response.raise_for_status()
 
-	async def _issue_json(self, method_retriever, url_path, request):
-		async with ClientSession() as session:
-			async with method_retriever(session)(f'{self.endpoint}/{url_path}', json=request) as response:
 				response_json = await response.json()
+				succeeded = True
+				outcome = 'ok'
 				return response_json
+		except (ClientConnectionError, asyncio.TimeoutError):
+			outcome = 'connection_error'
+			self.retry_stats['connection_errors'] += 1
+			raise
+		except asyncio.CancelledError:
+			# a hedged request that lost only bounds the latency of its node from below
+			cancelled = True
+			outcome = 'cancelled'
+			raise
+		finally:
+			elapsed = time.perf_counter() - start
+			limiter.release(elapsed, overloaded, not cancelled)
+			if cancelled:
+				self.node_pool.record_cancelled(endpoint, elapsed)
+			else:
+				self.node_pool.record(endpoint, elapsed, succeeded)
+
+			self._record_latency(method, url_path, elapsed, outcome)
+
+	@staticmethod
+	def _is_retryable(error):
+		if isinstance(error, ClientResponseError):
+			return 429 == error.status or error.status >= 500
+
+		return isinstance(error, (ClientConnectionError, asyncio.TimeoutError))
+
+	def _retry_delay(self, attempt, error):
+		# full jitter keeps clients that failed together from retrying together
+		delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+
+		retry_after = error.headers.get('Retry-After') if isinstance(error, ClientResponseError) and error.headers else None
+		if retry_after and retry_after.isdigit():
+			delay = max(delay, min(self.retry_max_delay, int(retry_after)))
+
+		return delay
+
+	async def _with_retries(self, issue):
+		"""
+		Awaits issue() again after a 429, 5xx, connection error or timeout.
+		Every request of this client is idempotent, re-announcing a signed transaction included.
+		"""
+
+		attempt = 0
+		while True:
+			try:
+				return await issue()
+			except Exception as error:
+				if not self._is_retryable(error):
+					raise
+
+				if attempt == self.max_retries:
+					self.retry_stats['gave_up'] += 1
+					METRICS.increment('symbol_client_gave_up_total')
+					raise
+
+				await asyncio.sleep(self._retry_delay(attempt, error))
+				attempt += 1
+				self.retry_stats['retries'] += 1
+				METRICS.increment('symbol_client_retries_total')
+
+	async def _read(self, method, url_path, request=None):
+		"""
+		Sends a read to the best ranked node, failing over to the next one on error.
+		With hedge_after set, a duplicate goes to the next node when no response arrived in time and the first wins.
+		"""
+
+		endpoints = iter(self.node_pool.ranked())
+		pending = set()
+		errors = []
+
+		def launch():
+			endpoint = next(endpoints, None)
+			if endpoint:
+				pending.add(asyncio.create_task(self._request(endpoint, method, url_path, request)))
+
+			return endpoint is not None
+
+		has_more = launch()
+		try:
+			while pending:
+				timeout = self.hedge_after if has_more else None
+				done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+				if not done:
+					has_more = launch()
+					continue
+
+				for task in done:
+					pending.discard(task)
+					if not task.exception():
+						return task.result()
+
+					errors.append(task.exception())
+
+				if not pending:
+					has_more = launch()
+		finally:
+			for task in pending:
+				task.cancel()
+
+		raise errors[-1]
+
+	async def get(self, url_path, property_name):
+		"""Initiates a GET to the specified path and returns the desired property."""
+
+		response_json = await self._with_retries(lambda: self._read('GET', url_path))
+		return response_json if property_name is None else response_json[property_name]
 
 	async def post(self, url_path, request):
-		"""Initiates a POST to the specified path and returns the result."""
+		"""Initiates a POST (a query, so it is routed like a read) to the specified path and returns the result."""
 
-		return await self._issue_json(lambda session: session.post, url_path, request)
+		return await self._with_retries(lambda: self._read('POST', url_path, request))
 
 	async def put(self, url_path, request):
-		"""Initiates a PUT to the specified path and returns the result."""
+		"""Initiates a PUT to the announce_fanout best ranked nodes and returns the result of the best one that succeeded."""
+
+		return await self._with_retries(lambda: self._fan_out('PUT', url_path, request))
+
+	async def _fan_out(self, method, url_path, request):
+		endpoints = self.node_pool.ranked()[:self.announce_fanout]
+		results = await asyncio.gather(
+			*(self._request(endpoint, method, url_path, request) for endpoint in endpoints),
+			return_exceptions=True)
+
+		# a node rejecting the transaction answers with an error body, which only wins when no node accepted it
+		responses = [result for result in results if not isinstance(result, BaseException)]
+		for response in responses:
+			if not (isinstance(response, dict) and 'code' in response):
+				return response
+
+		if responses:
+			return responses[0]
 
-		return await self._issue_json(lambda session: session.put, url_path, request)
+		raise results[0]
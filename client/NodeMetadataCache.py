@@ -0,0 +1,96 @@
+import json
+import time
+
+
+class NodeMetadataCache:
+	"""Node metadata with a time to live per field, optionally persisted to a JSON file between runs."""
+
+	DEFAULT_TTLS = {
+		'network_identifier': 24 * 60 * 60,
+		'network_properties': 24 * 60 * 60,
+		'median_fee_multiplier': 60,
+		'node_time': 10 * 60
+	}
+
+	def __init__(self, filename=None, ttls=None, scope=None):
+		"""
+		Creates a cache, persisted to filename when given; ttls overrides DEFAULT_TTLS (in seconds) per field.
+		A persisted cache written for another scope (e.g. network and node urls) is dropped on load.
+		"""
+
+		self.filename = filename
+		self.scope = scope
+		self.ttls = {**self.DEFAULT_TTLS, **(ttls or {})}
+
+		# name -> (value, wall clock time it was fetched)
+		self._entries = {}
+
+		# (network timestamp, monotonic time) of the node/time sample taken by this process
+		self._time_sample = None
+
+		self.load_from_json()
+
+	def load_from_json(self):
+		if not self.filename:
+			return
+
+		try:
+			with open(self.filename, 'r') as file:
+				cache = json.load(file)
+		except (FileNotFoundError, ValueError):
+			cache = {}
+
+		# metadata of another network or node would be wrong here, e.g. the currency mosaic id
+		if self.scope != cache.get('scope'):
+			self._entries = {}
+			return
+
+		self._entries = {name: tuple(entry) for name, entry in cache.get('entries', {}).items()}
+
+	def save_to_json(self):
+		if not self.filename:
+			return
+
+		with open(self.filename, 'w') as file:
+			json.dump({'scope': self.scope, 'entries': self._entries}, file)
+
+	def _is_fresh(self, name, fetched_at, now):
+		return 0 <= now - fetched_at < self.ttls[name]
+
+	def get(self, name):
+		"""Returns the cached value of name, None when missing or expired."""
+
+		entry = self._entries.get(name)
+		if entry and self._is_fresh(name, entry[1], time.time()):
+			return entry[0]
+
+		return None
+
+	def set(self, name, value):
+		self._entries[name] = (value, time.time())
+		self.save_to_json()
+
+	def set_network_time(self, network_timestamp):
+		self._time_sample = (network_timestamp, time.monotonic())
+		self.set('node_time', network_timestamp)
+
+	def network_time(self):
+		"""
+		Derives the current network timestamp from the last node/time sample and the elapsed local time.
+		Uses the monotonic clock for a sample of this process and the wall clock for one persisted by an earlier run.
+		"""
+
+		if self._time_sample:
+			network_timestamp, sampled_at = self._time_sample
+			now = time.monotonic()
+			if self._is_fresh('node_time', sampled_at, now):
+				return network_timestamp + int((now - sampled_at) * 1000)
+
+		entry = self._entries.get('node_time')
+		if entry:
+			network_timestamp, fetched_at = entry
+			now = time.time()
+			if self._is_fresh('node_time', fetched_at, now):
+				return network_timestamp + int((now - fetched_at) * 1000)
+
+		return None
@@ -0,0 +1,89 @@
+import time
+
+
+class NodeScore:
+	"""Rolling latency and error rate of one node."""
+
+	def __init__(self, endpoint):
+		self.endpoint = endpoint
+		self.latency = None
+		self.error_rate = 0.0
+		self.consecutive_failures = 0
+		self.unhealthy_until = 0
+		self.requests = 0
+		self.failures = 0
+
+
+class NodePool:
+	"""
+	Ranks nodes by an exponentially weighted latency penalized by their error rate.
+	A node failing max_failures times in a row is skipped for cooldown seconds unless every node is unhealthy.
+	"""
+
+	def __init__(self, endpoints, decay=0.2, error_penalty=10, max_failures=3, cooldown=30):
+		if not endpoints:
+			raise ValueError('at least one node endpoint is required')
+
+		self.scores = {endpoint: NodeScore(endpoint) for endpoint in endpoints}
+		self.decay = decay
+		self.error_penalty = error_penalty
+		self.max_failures = max_failures
+		self.cooldown = cooldown
+
+	def _is_healthy(self, score, now):
+		return score.unhealthy_until <= now
+
+	def _cost(self, score):
+		# nodes never measured rank first so every node gets probed, unless they only ever failed
+		if score.latency is None:
+			return float('inf') if score.failures else 0
+
+		return score.latency * (1 + self.error_penalty * score.error_rate)
+
+	def ranked(self):
+		"""Returns the endpoints ordered from best to worst, healthy nodes first."""
+
+		now = time.monotonic()
+		scores = sorted(self.scores.values(), key=lambda score: (not self._is_healthy(score, now), self._cost(score)))
+		return [score.endpoint for score in scores]
+
+	def best(self):
+		return self.ranked()[0]
+
+	def record(self, endpoint, elapsed, succeeded):
+		score = self.scores[endpoint]
+		score.requests += 1
+
+		if succeeded:
+			score.latency = elapsed if score.latency is None else (1 - self.decay) * score.latency + self.decay * elapsed
+			score.consecutive_failures = 0
+		else:
+			score.failures += 1
+			score.consecutive_failures += 1
+			if score.consecutive_failures >= self.max_failures:
+				score.unhealthy_until = time.monotonic() + self.cooldown
+
+		score.error_rate = (1 - self.decay) * score.error_rate + self.decay * (0 if succeeded else 1)
+
+	def record_cancelled(self, endpoint, elapsed):
+		"""
+		Records a request cancelled after elapsed seconds, e.g. a hedge that lost.
+		It took at least that long, so the latency is only ever raised to it and the error counts are left alone.
+		"""
+
+		score = self.scores[endpoint]
+		score.requests += 1
+		score.latency = elapsed if score.latency is None else max(score.latency, elapsed)
+
+	def stats(self):
+		now = time.monotonic()
+		return {
+			score.endpoint: {
+				'latency_seconds': score.latency,
+				'error_rate': score.error_rate,
+				'healthy': self._is_healthy(score, now),
+				'requests': score.requests,
+				'failures': score.failures
+			}
+			for score in self.scores.values()
+		}
@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+	"""Allows rate requests per second on average with bursts of up to burst requests (a tenth of a second by default)."""
+
+	def __init__(self, rate, burst=None):
+		self.rate = rate
+		self.burst = burst or max(1, rate / 10)
+		self.tokens = self.burst
+		self.updated = time.monotonic()
+		self.throttled_requests = 0
+		self.throttled_seconds = 0.0
+		self._lock = asyncio.Lock()
+
+	def _refill(self):
+		now = time.monotonic()
+		self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+		self.updated = now
+
+	async def acquire(self):
+		# the lock keeps waiters in arrival order
+		async with self._lock:
+			self._refill()
+			if self.tokens < 1:
+				delay = (1 - self.tokens) / self.rate
+				self.throttled_requests += 1
+				self.throttled_seconds += delay
+				await asyncio.sleep(delay)
+				self._refill()
+
+			self.tokens -= 1
+
+
+class AimdLimiter:
+	"""
+	Bounds in flight requests by a limit that grows by one per window of successful requests (additive increase)
+	and is multiplied by decrease on overload, i.e. a 429/5xx response or a latency above latency_target.
+	"""
+
+	def __init__(self, initial_limit=8, min_limit=1, max_limit=64, decrease=0.5, latency_target=None):
+		self.limit = initial_limit
+		self.min_limit = min_limit
+		self.max_limit = max_limit
+		self.decrease = decrease
+		self.latency_target = latency_target
+		self.in_flight = 0
+		self.waits = 0
+		self.decreases = 0
+		self._waiters = []
+
+	async def acquire(self):
+		if self.in_flight >= int(self.limit):
+			self.waits += 1
+
+		while self.in_flight >= int(self.limit):
+			waiter = asyncio.get_running_loop().create_future()
+			self._waiters.append(waiter)
+			try:
+				await waiter
+			except asyncio.CancelledError:
+				# woken but cancelled before taking the slot, the wake up goes to the next waiter
+				if waiter.done() and not waiter.cancelled():
+					self._wake_waiters()
+
+				raise
+			finally:
+				if waiter in self._waiters:
+					self._waiters.remove(waiter)
+
+		self.in_flight += 1
+
+	def release(self, elapsed, overloaded, measured=True):
+		"""
+		Frees a slot and adapts the limit, synchronous so it is safe in the cleanup of cancelled requests.
+		A request that was not measured, e.g. cancelled, frees its slot without adapting the limit.
+		"""
+
+		self.in_flight -= 1
+
+		if measured:
+			if overloaded or (self.latency_target and elapsed > self.latency_target):
+				self.limit = max(self.min_limit, self.limit * self.decrease)
+				self.decreases += 1
+			else:
+				self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+		self._wake_waiters()
+
+	def _wake_waiters(self):
+		# wake as many waiters, oldest first, as there are free slots, they check the limit again
+		free_slots = int(self.limit) - self.in_flight
+		while free_slots > 0 and self._waiters:
+			waiter = self._waiters.pop(0)
+			if not waiter.done():
+				waiter.set_result(None)
+				free_slots -= 1
+
+	def stats(self):
+		return {'limit': self.limit, 'in_flight': self.in_flight, 'waits': self.waits, 'decreases': self.decreases}
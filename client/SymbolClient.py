@@ -7,11 +7,26 @@ from symbolchain.nem.Network import Address as NemAddress
 from symbolchain.symbol.Network import Network, NetworkTimestamp
 
 from client.BasicClient import BasicClient
+from client.NodeMetadataCache import NodeMetadataCache
 
 
 class SymbolClient(BasicClient):
 	"""Async client for connecting to a NEM node."""
 
+	def __init__(self, endpoint, metadata_cache=None, **kwargs):
+		"""Creates a client around an endpoint, keeping node metadata in metadata_cache."""
+
+		super().__init__(endpoint, **kwargs)
+		self.metadata_cache = metadata_cache or NodeMetadataCache()
+
+	async def _cached(self, name, fetch):
+		value = self.metadata_cache.get(name)
+		if value is None:
+			value = await fetch()
+			self.metadata_cache.set(name, value)
+
+		return value
+
 	async def height(self):
 		"""Gets current blockchain height."""
 
@@ -23,16 +38,21 @@ class SymbolClient(BasicClient):
 		return await self.put('transactions', transaction_payload)
 
 	async def node_time(self):
-		"""Gets node time."""
+		"""Gets node time, derived from a recent sample when one is cached."""
+
+		network_timestamp = self.metadata_cache.network_time()
+		if network_timestamp is None:
+			timestamps = await self.get('node/time', 'communicationTimestamps')
+			network_timestamp = int(timestamps['receiveTimestamp'])
+			self.metadata_cache.set_network_time(network_timestamp)
 
-		timestamps = await self.get('node/time', 'communicationTimestamps')
-		return NetworkTimestamp(int(timestamps['receiveTimestamp']))
+		return NetworkTimestamp(network_timestamp)
 
 	async def node_network(self):
 		"""Gets node network."""
 
 		if not self.network:
-			network_identifier = await self.get('node/info', 'networkIdentifier')
+			network_identifier = await self._cached('network_identifier', lambda: self.get('node/info', 'networkIdentifier'))
 			self.network = Network.TESTNET if 152 == network_identifier else Network.MAINNET
 
 		return self.network
@@ -52,16 +72,50 @@ class SymbolClient(BasicClient):
 		transactions = await self.get(url_path, 'data')
 		return transactions
 
-	async def incoming_transfer_transactions(self, recipient_address, from_height=707104, sort='asc', start_id=None):
-		"""Gets incoming transactions of the specified account."""
+	async def incoming_transfer_transactions(
+		self,
+		recipient_address,
+		from_height=707104,
+		sort='asc',
+		start_id=None,
+		page_size=100,
+		transfer_mosaic_id=None,
+		from_transfer_amount=None
+	):
+		"""Gets incoming transactions of the specified account, optionally filtered by transferred mosaic and amount."""
+
+		url_path = f'transactions/confirmed?recipientAddress={recipient_address}&embedded=true&fromHeight={from_height}&pageSize={page_size}&order={sort}&type=16724'
+		if transfer_mosaic_id:
+			url_path += f'&transferMosaicId={transfer_mosaic_id}'
+			if from_transfer_amount:
+				url_path += f'&fromTransferAmount={from_transfer_amount}'
 
-		url_path = f'transactions/confirmed?recipientAddress={recipient_address}&embedded=true&fromHeight={from_height}&pageSize=100&order={sort}&type=16724'
 		if start_id:
 			url_path += f'&offset={start_id}'
 
 		transactions = await self.get(url_path, 'data')
 		return transactions
 
+	async def incoming_transfer_transaction_pages(self, recipient_address, start_id=None, page_size=100, **filters):
+		"""Pages through all incoming transactions after start_id in ascending order, yielding one page at a time."""
+
+		while True:
+			transactions = await self.incoming_transfer_transactions(
+				recipient_address,
+				start_id=start_id,
+				page_size=page_size,
+				**filters)
+
+			if not transactions:
+				return
+
+			yield transactions
+
+			if len(transactions) < page_size:
+				return
+
+			start_id = transactions[-1]['id']
+
 	async def transaction_confirmed(self, transaction_hash):
 		"""Gets a confirmed transaction."""
 
@@ -76,13 +130,12 @@ class SymbolClient(BasicClient):
 	async def currency_mosaic_id(self):
 		"""Gets the currency mosaic id from the network."""
 
-		if not self._network_properties:
-			self._network_properties = await self.get('network/properties', 'chain')
+		network_properties = await self._cached('network_properties', lambda: self.get('network/properties', 'chain'))
 
-		formatted_currency_mosaic_id = self._network_properties['currencyMosaicId']
+		formatted_currency_mosaic_id = network_properties['currencyMosaicId']
 		return int(formatted_currency_mosaic_id.replace('\'', ''), 16)
 
 	async def median_fee_multiplier(self):
 		"""Gets the median fee multiplier from the network."""
 
-		return await self.get('network/fees/transaction', 'medianFeeMultiplier')
+		return await self._cached('median_fee_multiplier', lambda: self.get('network/fees/transaction', 'medianFeeMultiplier'))
@@ -1,14 +1,167 @@
+import io
+import threading
+import time
+from collections import OrderedDict
+
 from PIL import Image
 
-def generate_images_nft(filenames, output_filename):
+
+class ImageLruCache:
+    """
+    Size-bounded LRU of decoded images, accounted in bytes of raw pixel data.
+    Safe to share between threads; cached images must not be modified.
+
+    Parameters:
+    - max_bytes: Upper bound on the total pixel memory held by the cache.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def image_bytes(image):
+        return image.width * image.height * len(image.getbands())
+
+    def __len__(self):
+        return len(self._images)
+
+    def get(self, key):
+        with self._lock:
+            image = self._images.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._images.move_to_end(key)
+            return image
+
+    def put(self, key, image):
+        size = self.image_bytes(image)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._images:
+                self.current_bytes -= self.image_bytes(self._images.pop(key))
+
+            self._images[key] = image
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._images.popitem(last=False)
+                self.current_bytes -= self.image_bytes(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._images),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+class LayerCache:
+    """
+    Per-process cache of decoded art layers and of composites of their leading layers.
+
+    Layers are decoded once, in their own mode so the output matches the uncached path, and
+    reused by every render. Renders may run in several threads. Composites are keyed by the
+    tuple of layer paths stacked so far, so orders sharing a prefix (e.g. feet + body) only
+    compose it once.
+
+    Parameters:
+    - max_layer_bytes: Pixel memory budget for decoded layers.
+    - max_composite_bytes: Pixel memory budget for prefix composites.
+    """
+
+    def __init__(self, max_layer_bytes=64 * 1024 * 1024, max_composite_bytes=64 * 1024 * 1024):
+        self.layers = ImageLruCache(max_layer_bytes)
+        self.composites = ImageLruCache(max_composite_bytes)
+
+    def layer(self, filename):
+        image = self.layers.get(filename)
+        if image is None:
+            with Image.open(filename) as source:
+                image = source.copy()
+
+            self.layers.put(filename, image)
+
+        return image
+
+    def compose(self, filenames):
+        """
+        Stack the layers in order and return a new image the caller is free to modify.
+        """
+
+        key = tuple(filenames)
+
+        # Start from the longest leading stack that has already been composed
+        depth = len(key)
+        while depth > 1:
+            composite = self.composites.get(key[:depth])
+            if composite is not None:
+                break
+
+            depth -= 1
+        else:
+            composite = self.layer(key[0])
+
+        stacked_img = composite.copy()
+
+        for depth in range(depth, len(key)):
+            img = self.layer(key[depth])
+            stacked_img.paste(img, (0, 0), img)  # The last parameter is the alpha mask for transparency
+
+            if depth + 1 < len(key):
+                self.composites.put(key[:depth + 1], stacked_img.copy())
+
+        return stacked_img
+
+    def clear(self):
+        self.layers.clear()
+        self.composites.clear()
+
+    def stats(self):
+        return {
+            'layers': self.layers.stats(),
+            'composites': self.composites.stats()
+        }
+
+
+# Shared by every render in this process
+LAYER_CACHE = LayerCache()
+
+
+def generate_images_nft(filenames, output_filename, cache=LAYER_CACHE):
     """
     Stack multiple PNG images on top of each other, like layering in NFT art.
 
     Parameters:
     - filenames: List of paths to PNG images to stack.
     - output_filename: Path where the stacked image will be saved.
+    - cache: LayerCache holding decoded layers; pass None to decode every layer from disk.
     """
 
+    if cache is not None:
+        cache.compose(filenames).save(output_filename)
+        return
+
     # Open the first image
     stacked_img = Image.open(filenames[0])
 
@@ -19,3 +172,145 @@ def generate_images_nft(filenames, output_filename):
 
     # Save the stacked image
     stacked_img.save(output_filename)
+
+
+def parse_order_message(message):
+    """
+    Parse an order message into its image code and mosaic supply.
+
+    Parameters:
+    - message: Order message such as 1,1,1,1,1,1 or 1,1,1,1,1,1,10 (the 7th value is the supply).
+    """
+
+    mosaic_supply = 1
+    image_code = [1, 1, 1, 1, 1, 1]
+
+    values = message.split(',')
+    if len(values) == 6:
+        image_code = [int(x)+1 for x in values]
+    elif len(values) == 7:
+        image_code = [int(x)+1 for x in values[:6]]
+        mosaic_supply = int(values[6])
+
+    return image_code, mosaic_supply
+
+
+def art_layers(image_code, art_source='art_source'):
+    """
+    Return the layer paths for an image code in stacking order (bottom first).
+
+    Parameters:
+    - image_code: Six 1-based indexes for arm left, arm right, eyes, feet, mouth and stem.
+    - art_source: Folder holding the art layers.
+    """
+
+    # image name format example: Arm Left_1.png (1-9)
+    arm_left = f'{art_source}/arm-left/Arm Left_{image_code[0]}.png'
+    arm_right = f'{art_source}/arm-right/Arm Right_{image_code[1]}.png'
+    body = f'{art_source}/body/body.png'
+    eyes = f'{art_source}/eyes/Eyes_{image_code[2]}.png'
+    feet = f'{art_source}/legs/feet_{image_code[3]}.png'
+    mouth = f'{art_source}/mouth/Mouth_{image_code[4]}.png'
+    stem = f'{art_source}/stem/stem_{image_code[5]}.png'
+
+    return [
+        feet,
+        body,
+        arm_left,
+        arm_right,
+        eyes,
+        mouth,
+        stem
+    ]
+
+
+def _png_bytes(image, **params):
+    with io.BytesIO() as output:
+        image.save(output, format='PNG', **params)
+        return output.getvalue()
+
+
+def encode_png(image, optimize=False):
+    """
+    Encode an image as PNG bytes.
+
+    Parameters:
+    - image: Image to encode.
+    - optimize: Try lossless alternatives (RGB when opaque, cleared fully transparent pixels, exact palette)
+      with maximum zlib compression and keep the smallest encoding.
+    """
+
+    if not optimize:
+        return _png_bytes(image)
+
+    candidates = [image]
+
+    if 'RGBA' == image.mode:
+        alpha = image.getchannel('A')
+        if (255, 255) == alpha.getextrema():
+            candidates.append(image.convert('RGB'))
+        else:
+            # colour under fully transparent pixels is invisible, zeroing it compresses better
+            cleared = Image.new('RGBA', image.size, (0, 0, 0, 0))
+            cleared.paste(image, (0, 0), alpha.point(lambda value: 255 if value else 0))
+            candidates.append(cleared)
+
+    if image.getcolors(256) is not None:
+        method = Image.Quantize.FASTOCTREE if 'RGBA' == image.mode else Image.Quantize.MEDIANCUT
+        palette_image = image.quantize(256, method=method)
+
+        # only keep the palette image when it round trips exactly
+        if palette_image.convert(image.mode).tobytes() == image.tobytes():
+            candidates.append(palette_image)
+
+    encodings = [
+        _png_bytes(candidate, **params)
+        for candidate in candidates
+        for params in ({'compress_level': 9}, {'optimize': True})
+    ]
+    return min(encodings, key=len)
+
+
+def render_image_bytes(filenames, optimize=False, cache=LAYER_CACHE, timings=None):
+    """
+    Stack the layers and return the encoded PNG bytes without touching the disk.
+
+    Parameters:
+    - filenames: List of paths to PNG images to stack.
+    - optimize: Select the smallest lossless encoding (see encode_png).
+    - cache: LayerCache holding decoded layers.
+    - timings: Dict receiving the compose and encode durations in seconds, when given.
+    """
+
+    start = time.perf_counter()
+    image = cache.compose(filenames)
+    composed = time.perf_counter()
+    image_bytes = encode_png(image, optimize)
+
+    if timings is not None:
+        timings['compose'] = composed - start
+        timings['encode'] = time.perf_counter() - composed
+
+    return image_bytes
+
+
+def render_image_nft(job):
+    """
+    Render one (filenames, output_filename, optimize) job and return (output_filename, image_bytes, timings).
+
+    The encoded bytes are written to output_filename as-is, so the file and the bytes uploaded on chain match.
+    timings holds the compose, encode and write durations in seconds, measured in the worker.
+    Module level so it can be submitted to a ProcessPoolExecutor; each worker keeps its own LAYER_CACHE.
+    """
+
+    filenames, output_filename, optimize = job
+
+    timings = {}
+    image_bytes = render_image_bytes(filenames, optimize, timings=timings)
+
+    encoded = time.perf_counter()
+    with open(output_filename, 'wb') as file:
+        file.write(image_bytes)
+
+    timings['write'] = time.perf_counter() - encoded
+    return output_filename, image_bytes, timings
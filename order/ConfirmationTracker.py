@@ -0,0 +1,249 @@
+import asyncio
+import json
+import os
+import time
+
+from aiohttp import WSMsgType
+
+from Metrics import METRICS
+
+
+class ConfirmationTracker:
+	"""
+	Tracks transaction confirmations across orders with a local cache of confirmed hashes.
+
+	Confirmations arrive from the node's WebSocket channels when listening; otherwise (and right after connecting)
+	unconfirmed hashes are polled in bulk requests, but only once the chain height has advanced. While listening,
+	a safety poll every safety_poll_interval seconds catches confirmations whose message was missed.
+	"""
+
+	def __init__(self, client, filename='confirmed_hashes.json', batch_size=100, safety_poll_interval=300):
+		self.client = client
+		self.filename = filename
+		self.batch_size = batch_size
+		self.safety_poll_interval = safety_poll_interval
+
+		self.confirmed_hashes = set()
+
+		# hash -> status code of transactions the node rejected, they will never confirm
+		self.failed_hashes = {}
+		self._polled_at = None
+
+		# hashes seen unconfirmed at polled_height, they cannot confirm before the chain grows
+		self.polled_height = None
+		self.unconfirmed_hashes = set()
+
+		# websocket confirmations not written yet, they are saved once per refresh instead of once per message
+		self._dirty = False
+
+		self.websocket_connected = False
+		self._needs_sync = True
+		self._listen_task = None
+		self._listeners = []
+
+		self.load_from_json()
+
+	def load_from_json(self):
+		try:
+			with open(self.filename, 'r') as file:
+				data = json.load(file)
+		except FileNotFoundError:
+			return
+		except ValueError as error:
+			# the cache only saves requests, polling rebuilds it
+			print(f'ignoring unreadable confirmation cache {self.filename}: {error}')
+			return
+
+		# older caches only stored the list of confirmed hashes
+		if isinstance(data, list):
+			data = {'confirmed_hashes': data}
+
+		self.confirmed_hashes = set(data['confirmed_hashes'])
+		self.polled_height = data.get('polled_height')
+		self.unconfirmed_hashes = set(data.get('unconfirmed_hashes', []))
+		self.failed_hashes = data.get('failed_hashes', {})
+
+	def save_to_json(self):
+		temporary_filename = f'{self.filename}.{os.getpid()}.tmp'
+		with open(temporary_filename, 'w') as file:
+			json.dump({
+				'confirmed_hashes': sorted(self.confirmed_hashes),
+				'polled_height': self.polled_height,
+				'unconfirmed_hashes': sorted(self.unconfirmed_hashes),
+				'failed_hashes': self.failed_hashes
+			}, file)
+
+		os.replace(temporary_filename, self.filename)
+		self._dirty = False
+
+	def flush(self):
+		"""Saves the confirmations received since the last save, if any."""
+
+		if self._dirty:
+			self.save_to_json()
+
+	def forget(self, transaction_hashes):
+		"""Drops transaction_hashes from the cache once no order needs their state, so the cache does not grow forever."""
+
+		for transaction_hash in transaction_hashes:
+			transaction_hash = transaction_hash.upper()
+			self.confirmed_hashes.discard(transaction_hash)
+			self.unconfirmed_hashes.discard(transaction_hash)
+			self.failed_hashes.pop(transaction_hash, None)
+
+		self._dirty = True
+
+	def is_confirmed(self, transaction_hash):
+		return transaction_hash.upper() in self.confirmed_hashes
+
+	def add_listener(self):
+		"""Returns an event set whenever a new confirmation or failure arrives from the WebSocket."""
+
+		event = asyncio.Event()
+		self._listeners.append(event)
+		return event
+
+	def _confirm(self, transaction_hash):
+		self.confirmed_hashes.add(transaction_hash.upper())
+		self.unconfirmed_hashes.discard(transaction_hash.upper())
+		self._dirty = True
+
+	def _fail(self, transaction_hash, code):
+		if transaction_hash.upper() in self.failed_hashes:
+			return
+
+		self.failed_hashes[transaction_hash.upper()] = code
+		self._dirty = True
+		METRICS.increment('transaction_failures_total', code=str(code))
+		print(f'transaction {transaction_hash} failed: {code}')
+
+	def _notify(self):
+		for event in self._listeners:
+			event.set()
+
+	async def refresh(self, transaction_hashes):
+		"""Brings the confirmation state of transaction_hashes up to date, querying the node only when needed."""
+
+		self.flush()
+
+		unconfirmed = {transaction_hash.upper() for transaction_hash in transaction_hashes} - self.confirmed_hashes
+		if not unconfirmed:
+			return
+
+		# a connected and synchronized socket delivered the confirmations, but a dropped message is only caught by polling
+		now = time.monotonic()
+		if self.websocket_connected and not self._needs_sync and now - self._polled_at < self.safety_poll_interval:
+			return
+
+		self._needs_sync = False
+		self._polled_at = now
+		height = await self.client.height()
+
+		if height == self.polled_height:
+			unconfirmed -= self.unconfirmed_hashes
+		else:
+			self.unconfirmed_hashes = set()
+
+		if not unconfirmed:
+			return
+
+		unconfirmed = sorted(unconfirmed)
+		for i in range(0, len(unconfirmed), self.batch_size):
+			statuses = await self.client.transaction_statuses({'hashes': unconfirmed[i:i + self.batch_size]})
+
+			for status in statuses:
+				if 'confirmed' == status['group']:
+					self._confirm(status['hash'])
+					METRICS.increment('confirmations_total', source='poll')
+				elif 'failed' == status['group']:
+					self._fail(status['hash'], status.get('code'))
+
+		self.unconfirmed_hashes.update(set(unconfirmed) - self.confirmed_hashes - self.failed_hashes.keys())
+		self.polled_height = height
+		self.save_to_json()
+
+	def failed_orders(self, orders, order_hashes):
+		"""Returns order id -> {hash: status code} of the orders with a hash (as listed by order_hashes(order)) that failed."""
+
+		failed_orders = {}
+		for order in orders:
+			failures = {
+				transaction_hash: self.failed_hashes[transaction_hash.upper()]
+				for transaction_hash in order_hashes(order) if transaction_hash.upper() in self.failed_hashes
+			}
+			if failures:
+				failed_orders[order['order_id']] = failures
+
+		return failed_orders
+
+	async def confirmed_orders(self, orders, order_hashes):
+		"""Returns the ids of the orders whose hashes (as listed by order_hashes(order)) are all confirmed."""
+
+		await self.refresh([transaction_hash for order in orders for transaction_hash in order_hashes(order)])
+
+		return [
+			order['order_id'] for order in orders
+			if all(self.is_confirmed(transaction_hash) for transaction_hash in order_hashes(order))
+		]
+
+	def start_listening(self, address, reconnect_delay=5):
+		"""Subscribes to the confirmedAdded and status channels of address in a background task."""
+
+		if not self._listen_task:
+			self._listen_task = asyncio.create_task(self._listen(str(address), reconnect_delay))
+
+		return self._listen_task
+
+	async def stop_listening(self):
+		if self._listen_task:
+			self._listen_task.cancel()
+			try:
+				await self._listen_task
+			except asyncio.CancelledError:
+				pass
+
+			self._listen_task = None
+
+		self.flush()
+
+	async def _listen(self, address, reconnect_delay):
+		while True:
+			try:
+				async with self.client.websocket() as websocket:
+					uid = (await websocket.receive_json())['uid']
+					for channel in (f'confirmedAdded/{address}', f'status/{address}'):
+						await websocket.send_json({'uid': uid, 'subscribe': channel})
+
+					# confirmations that happened while disconnected are picked up by one poll
+					self.websocket_connected = True
+					self._needs_sync = True
+					self._notify()
+					print('listening for confirmations on websocket')
+
+					async for message in websocket:
+						if WSMsgType.TEXT != message.type:
+							break
+
+						self._handle_message(json.loads(message.data))
+			except asyncio.CancelledError:
+				raise
+			except Exception as error:  # fall back to polling until the socket is back
+				print(f'confirmation websocket failed: {error!r}')
+
+			self.websocket_connected = False
+			await asyncio.sleep(reconnect_delay)
+
+	def _handle_message(self, message):
+		topic = message.get('topic', '')
+		data = message.get('data', {})
+
+		if topic.startswith('confirmedAdded/'):
+			meta = data.get('meta', {})
+			transaction_hash = meta.get('hash') or meta.get('aggregateHash')
+			if transaction_hash:
+				self._confirm(transaction_hash)
+				METRICS.increment('confirmations_total', source='websocket')
+				self._notify()
+		elif topic.startswith('status/'):
+			self._fail(data['hash'], data.get('code'))
+			self._notify()
@@ -0,0 +1,57 @@
+import hashlib
+import json
+import os
+
+
+class ImageIndex:
+	"""
+	Content-addressed index from the SHA-256 digest of an image to the chunk transactions confirmed on chain for it.
+	Images are kept per scope (network and storage address), chunks of another chain are never handed out.
+	"""
+
+	def __init__(self, filename='image_index.json', scope=None):
+		self.filename = filename
+		self.scope = scope
+
+		# scope -> digest -> {image_hash, image_size, order_id}
+		self.scopes = {}
+		self.images = {}
+
+		self.load_from_json()
+
+	@staticmethod
+	def digest(image_bytes):
+		return hashlib.sha256(image_bytes).hexdigest().upper()
+
+	def load_from_json(self):
+		try:
+			with open(self.filename, 'r') as file:
+				scopes = json.load(file)
+		except FileNotFoundError:
+			scopes = {}
+
+		self.scopes = scopes
+		self.images = self.scopes.setdefault(str(self.scope), {})
+
+	def save_to_json(self):
+		# a torn write would lose every reuse record
+		temporary_filename = f'{self.filename}.{os.getpid()}.tmp'
+		with open(temporary_filename, 'w') as file:
+			json.dump(self.scopes, file, indent='\t')
+
+		os.replace(temporary_filename, self.filename)
+
+	def get(self, digest):
+		"""Returns {image_hash, image_size, order_id} of an image already on chain, None when it was never confirmed."""
+
+		return self.images.get(digest)
+
+	def add(self, digest, image_hashes, image_size, order_id):
+		"""Records the confirmed chunk transactions of an image, keeping the first upload of each digest."""
+
+		if digest in self.images:
+			return False
+
+		self.images[digest] = {'image_hash': image_hashes, 'image_size': image_size, 'order_id': order_id}
+		self.save_to_json()
+		return True
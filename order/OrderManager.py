@@ -1,64 +1,55 @@
-import json
 from enum import Enum
 
+from order.OrderStore import open_order_store
+
 class OrderStatus(str, Enum):
+    PENDING_UPLOAD_RETRY = "pending_upload_retry"
     PENDING_IMAGE_CONTAINER = "pending_image_container"
     PENDING_SETTLEMENT = "pending_settlement"
     COMPLETED = "completed"
 
 class OrderManager:
-	def __init__(self, filename='order.json'):
+	def __init__(self, filename='order.json', store=None):
+		# order.json keeps the JSON file store, order.db (or .sqlite) uses the indexed SQLite store
 		self.filename = filename
-
-	def load_from_json(self):
-		try:
-			with open(self.filename, 'r') as file:
-				if not file.read(1):  # Check if the file is empty by reading the first character
-					return []
-				file.seek(0)  # Reset file pointer back to the beginning
-				return json.load(file)
-		except FileNotFoundError:
-			return []
+		self.store = store or open_order_store(filename)
 
 	def add_order(self, order_info):
-		orders = self.load_from_json()
-
-		# Auto-increment order_id based on the last order's ID
-		order_id = orders[-1]["order_id"] + 1 if orders else 1
-		order_info["order_id"] = order_id
-
-		orders.append(order_info)
-		self.save_to_json(orders)
+		[order_id] = self.store.add_orders([order_info])
 		return order_id  # Return the new order's ID for confirmation or further use
 
+	def add_orders(self, orders_info):
+		return self.store.add_orders(orders_info)
+
 	def update_order(self, order_id, updated_order_info):
-		orders = self.load_from_json()
-		for order in orders:
-			if order["order_id"] == order_id:
-				order.update(updated_order_info)
-				self.save_to_json(orders)
-				return True
-		return False
+		return order_id in self.store.update_orders({order_id: updated_order_info})
 
-	def save_to_json(self, data):
-		with open(self.filename, 'w') as file:
-			json.dump(data, file, indent='\t')
+	def update_orders(self, updates):
+		# updates: order_id -> updated order info, applied in one write
+		return self.store.update_orders(updates)
 
 	def get_order(self, order_id):
-		orders = self.load_from_json()
-		for order in orders:
-			if order["order_id"] == order_id:
-				return order
-		return None  # Order not found
+		return self.store.get_order(order_id)  # None when the order is not found
+
+	def get_order_by_hash(self, order_hash):
+		return self.store.get_order_by_hash(order_hash)
+
+	def has_order(self, order_hash, order_key):
+		# orders recorded before order_key existed are keyed by their hash
+		orders = self.store.get_orders_by_hash(order_hash)
+		return any(order_key == order.get("order_key", order["order_hash"]) for order in orders)
+
+	def all_orders(self):
+		return self.store.all_orders()
 
 	def total_orders(self):
-		orders = self.load_from_json()
-		return len(orders)
+		return self.store.total_orders()
+
+	def get_pending_upload_retry_orders(self):
+		return self.store.get_orders_by_status(OrderStatus.PENDING_UPLOAD_RETRY)
 
 	def get_pending_image_mosaic_orders(self):
-		orders = self.load_from_json()
-		return [order for order in orders if order["order_status"] == OrderStatus.PENDING_IMAGE_CONTAINER]
+		return self.store.get_orders_by_status(OrderStatus.PENDING_IMAGE_CONTAINER)
 
 	def get_pending_settlement_orders(self):
-		orders = self.load_from_json()
-		return [order for order in orders if order["order_status"] == OrderStatus.PENDING_SETTLEMENT]
+		return self.store.get_orders_by_status(OrderStatus.PENDING_SETTLEMENT)
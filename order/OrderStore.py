@@ -0,0 +1,191 @@
+import json
+import pathlib
+import sqlite3
+from enum import Enum
+
+
+class JsonOrderStore:
+	"""Keeps all orders in one JSON file that is read and rewritten as a whole."""
+
+	def __init__(self, filename='order.json'):
+		self.filename = filename
+
+	def load_from_json(self):
+		try:
+			with open(self.filename, 'r') as file:
+				if not file.read(1):  # Check if the file is empty by reading the first character
+					return []
+				file.seek(0)  # Reset file pointer back to the beginning
+				return json.load(file)
+		except FileNotFoundError:
+			return []
+
+	def save_to_json(self, data):
+		with open(self.filename, 'w') as file:
+			json.dump(data, file, indent='\t')
+
+	def all_orders(self):
+		return self.load_from_json()
+
+	def add_orders(self, orders_info):
+		orders = self.load_from_json()
+
+		# Auto-increment order_id based on the last order's ID
+		order_ids = []
+		for order_info in orders_info:
+			order_info["order_id"] = orders[-1]["order_id"] + 1 if orders else 1
+			orders.append(order_info)
+			order_ids.append(order_info["order_id"])
+
+		self.save_to_json(orders)
+		return order_ids
+
+	def update_orders(self, updates):
+		orders = self.load_from_json()
+
+		updated_ids = set()
+		for order in orders:
+			if order["order_id"] in updates:
+				order.update(updates[order["order_id"]])
+				updated_ids.add(order["order_id"])
+
+		if updated_ids:
+			self.save_to_json(orders)
+
+		return updated_ids
+
+	def get_order(self, order_id):
+		for order in self.load_from_json():
+			if order["order_id"] == order_id:
+				return order
+		return None
+
+	def get_order_by_hash(self, order_hash):
+		for order in self.load_from_json():
+			if order["order_hash"] == order_hash:
+				return order
+		return None
+
+	def get_orders_by_hash(self, order_hash):
+		return [order for order in self.load_from_json() if order["order_hash"] == order_hash]
+
+	def get_orders_by_status(self, order_status):
+		return [order for order in self.load_from_json() if order["order_status"] == order_status]
+
+	def total_orders(self):
+		return len(self.load_from_json())
+
+
+class SqliteOrderStore:
+	"""Keeps orders in a SQLite database indexed by order_id, order_status and order_hash."""
+
+	def __init__(self, filename='order.db', read_only=False):
+		self.filename = filename
+
+		if read_only:
+			# readers never create the database or its schema, the workflows own it
+			uri = f'{pathlib.Path(filename).absolute().as_uri()}?mode=ro'
+			self.connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+			return
+
+		self.connection = sqlite3.connect(filename)
+		self.connection.execute('PRAGMA journal_mode=WAL')
+		with self.connection:
+			self.connection.execute(
+				'CREATE TABLE IF NOT EXISTS orders ('
+				'order_id INTEGER PRIMARY KEY, order_status TEXT NOT NULL, order_hash TEXT, data TEXT NOT NULL)')
+			self.connection.execute('CREATE INDEX IF NOT EXISTS orders_by_status ON orders (order_status, order_id)')
+			self.connection.execute('CREATE INDEX IF NOT EXISTS orders_by_hash ON orders (order_hash)')
+
+	@staticmethod
+	def _column_value(value):
+		return value.value if isinstance(value, Enum) else value
+
+	def _insert(self, order_info):
+		self.connection.execute(
+			'INSERT OR REPLACE INTO orders (order_id, order_status, order_hash, data) VALUES (?, ?, ?, ?)',
+			(
+				order_info["order_id"],
+				self._column_value(order_info.get("order_status", '')),
+				order_info.get("order_hash"),
+				json.dumps(order_info)
+			))
+
+	def _select(self, where='', parameters=()):
+		cursor = self.connection.execute(f'SELECT data FROM orders {where} ORDER BY order_id', parameters)
+		return [json.loads(data) for (data,) in cursor]
+
+	def all_orders(self):
+		return self._select()
+
+	def add_orders(self, orders_info):
+		with self.connection:
+			(last_order_id,) = self.connection.execute('SELECT MAX(order_id) FROM orders').fetchone()
+
+			order_ids = []
+			for order_info in orders_info:
+				last_order_id = (last_order_id or 0) + 1
+				order_info["order_id"] = last_order_id
+				self._insert(order_info)
+				order_ids.append(last_order_id)
+
+		return order_ids
+
+	def update_orders(self, updates):
+		updated_ids = set()
+
+		with self.connection:
+			for order_id, updated_order_info in updates.items():
+				row = self.connection.execute('SELECT data FROM orders WHERE order_id = ?', (order_id,)).fetchone()
+				if not row:
+					continue
+
+				order = json.loads(row[0])
+				order.update(updated_order_info)
+				self._insert(order)
+				updated_ids.add(order_id)
+
+		return updated_ids
+
+	def get_order(self, order_id):
+		orders = self._select('WHERE order_id = ?', (order_id,))
+		return orders[0] if orders else None
+
+	def get_order_by_hash(self, order_hash):
+		orders = self._select('WHERE order_hash = ?', (order_hash,))
+		return orders[0] if orders else None
+
+	def get_orders_by_hash(self, order_hash):
+		return self._select('WHERE order_hash = ?', (order_hash,))
+
+	def get_orders_by_status(self, order_status):
+		return self._select('WHERE order_status = ?', (self._column_value(order_status),))
+
+	def total_orders(self):
+		(count,) = self.connection.execute('SELECT COUNT(*) FROM orders').fetchone()
+		return count
+
+	def migrate_from_json(self, json_filename):
+		"""Copies every order of a JSON order file, keeping their ids, in one transaction."""
+
+		orders = JsonOrderStore(json_filename).load_from_json()
+		with self.connection:
+			for order_info in orders:
+				self._insert(order_info)
+
+		return len(orders)
+
+	def close(self):
+		self.connection.close()
+
+
+def open_order_store(filename, read_only=False):
+	"""
+	Opens a SQLite store for .db/.sqlite files and a JSON store otherwise.
+	A read_only SQLite store neither creates the database nor its schema, JSON stores only write on add and update.
+	"""
+
+	if filename.endswith(('.db', '.sqlite', '.sqlite3')):
+		return SqliteOrderStore(filename, read_only)
+
+	return JsonOrderStore(filename)
@@ -0,0 +1,44 @@
+import json
+import os
+
+
+class UploadRetries:
+	"""
+	Signed image chunk aggregates whose announce failed, by order id, kept out of the order documents.
+	Payloads are announced again as is until their deadline, the chunks are signed again after it.
+	"""
+
+	def __init__(self, filename='upload_retries.json'):
+		self.filename = filename
+
+		# order id -> {deadline, payloads: transaction hash -> signed json payload}
+		self.retries = {}
+
+		self.load_from_json()
+
+	def load_from_json(self):
+		try:
+			with open(self.filename, 'r') as file:
+				self.retries = json.load(file)
+		except FileNotFoundError:
+			self.retries = {}
+
+	def save_to_json(self):
+		temporary_filename = f'{self.filename}.{os.getpid()}.tmp'
+		with open(temporary_filename, 'w') as file:
+			json.dump(self.retries, file)
+
+		os.replace(temporary_filename, self.filename)
+
+	def get(self, order_id):
+		"""Returns {deadline, payloads} of an order, None when none of its announces is pending."""
+
+		return self.retries.get(str(order_id))
+
+	def set(self, order_id, deadline, payloads):
+		self.retries[str(order_id)] = {'deadline': int(deadline), 'payloads': payloads}
+		self.save_to_json()
+
+	def remove(self, order_id):
+		if self.retries.pop(str(order_id), None) is not None:
+			self.save_to_json()
@@ -1,16 +1,258 @@
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, abort, current_app, jsonify, request, send_file, send_from_directory
 from flask_cors import CORS
+from bisect import bisect_left, bisect_right
+import hashlib
 import os
-import json
+import threading
+
+from order.OrderManager import OrderManager
+from order.OrderStore import open_order_store
+from rest.image_variants import ImageVariantCache
+from rest.render_cache import InvalidTraitCode, RenderCache
 
 IMAGES_FOLDER = os.environ.get('IMAGES_FOLDER', '/art_generated')
 Order_FILE = os.environ.get('ORDER_FILE', 'data/order.json')
+IMAGE_VARIANT_FOLDER = os.environ.get('IMAGE_VARIANT_FOLDER', 'data/image_variants')
+IMAGE_VARIANT_CACHE_BYTES = int(os.environ.get('IMAGE_VARIANT_CACHE_BYTES', 256 * 1024 * 1024))
+IMAGE_VARIANT_MAX_AGE = 30 * 24 * 60 * 60
+ART_SOURCE = os.environ.get('ART_SOURCE', 'art_source')
+RENDER_CACHE_FOLDER = os.environ.get('RENDER_CACHE_FOLDER', 'data/render_cache')
+RENDER_CACHE_BYTES = int(os.environ.get('RENDER_CACHE_BYTES', 256 * 1024 * 1024))
+
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+FILTER_PARAMETERS = ('status', 'buyer_address', 'mosaic_id')
+
+
+def normalize_mosaic_id(mosaic_id):
+	return mosaic_id.replace('0x', '').upper()
+
+
+class OrderIndex:
+	"""Positions of items (sorted by order_id) by filter value, so filtered pages never scan every order."""
+
+	def __init__(self, items, filter_values):
+		self.items = items
+		self.order_ids = [item['order_id'] for item in items]
+		self.positions = {name: {} for name in FILTER_PARAMETERS}
+
+		for position, item in enumerate(items):
+			for name, value in filter_values(item).items():
+				self.positions[name].setdefault(value, []).append(position)
+
+		# membership checks of combined filters, built once per reload instead of per request
+		self.position_sets = {
+			name: {value: set(positions) for value, positions in values.items()}
+			for name, values in self.positions.items()
+		}
+
+	def query(self, filters, after=None, limit=None):
+		"""Returns the items matching every filter with order_id greater than after, and whether more remain."""
+
+		start = 0 if after is None else bisect_right(self.order_ids, after)
+
+		if not filters:
+			positions = range(start, len(self.items))
+		else:
+			# walk the shortest position list and check the other filters by membership
+			matches = sorted(filters.items(), key=lambda match: len(self.positions[match[0]].get(match[1], [])))
+			shortest = self.positions[matches[0][0]].get(matches[0][1], [])
+			others = [self.position_sets[name].get(value, set()) for name, value in matches[1:]]
+			positions = (
+				position for position in shortest[bisect_left(shortest, start):]
+				if all(position in other for other in others)
+			)
+
+		items = []
+		for position in positions:
+			if limit is not None and len(items) == limit:
+				return items, True
+
+			items.append(self.items[position])
+
+		return items, False
+
+
+class OrderCache:
+	"""Parsed orders of one worker plus their serialized responses, reloaded when the order file changes."""
+
+	def __init__(self, filename):
+		self.filename = filename
+		self.orders = []
+		self.mosaics = []
+		self.order_index = OrderIndex([], dict)
+		self.mosaic_index = OrderIndex([], dict)
+		self._version = None
+		self._bodies = {}
+		self._lock = threading.Lock()
+		self._order_manager = None
+
+	def order_manager(self):
+		"""Returns the read-only order store of this worker, None until the workflows created the order file."""
+
+		if not self._order_manager and os.path.exists(self.filename):
+			self._order_manager = OrderManager(self.filename, open_order_store(self.filename, read_only=True))
+
+		return self._order_manager
+
+	def _file_version(self):
+		# a sqlite store also writes to its -wal file before checkpointing
+		version = []
+		for filename in (self.filename, f'{self.filename}-wal'):
+			try:
+				stat = os.stat(filename)
+				version.append((stat.st_mtime_ns, stat.st_size))
+			except FileNotFoundError:
+				version.append(None)
+
+		return tuple(version)
+
+	def refresh(self):
+		version = self._file_version()
+		if version == self._version:
+			return
+
+		with self._lock:
+			if version == self._version:
+				return
+
+			order_manager = self.order_manager()
+			orders = order_manager.all_orders() if order_manager else []
+
+			for order in orders:
+				order['art_png'] = order['message'].replace(',', '_') + '.png'
+
+			self.mosaics = [
+				{
+					"art_png": order['art_png'],
+					"mosaic_id": normalize_mosaic_id(order['mosaic_id']),
+					"mosaic_supply": order['mosaic_supply'],
+					"order_id": order['order_id'],
+					"buyer_address": order['buyer_address'],
+					"image_container_hash": order['image_container_hash'],
+				}
+				for order in orders if order["order_status"] == 'completed'
+			]
+			self.order_index = OrderIndex(orders, lambda order: {
+				'status': order['order_status'],
+				'buyer_address': order['buyer_address'],
+				'mosaic_id': normalize_mosaic_id(order['mosaic_id'])
+			})
+			self.mosaic_index = OrderIndex(self.mosaics, lambda mosaic: {
+				'status': 'completed',
+				'buyer_address': mosaic['buyer_address'],
+				'mosaic_id': mosaic['mosaic_id']
+			})
+			self.orders = orders
+			self._bodies = {}
+			self._version = version
+
+	def body(self, key, build):
+		"""Returns the memoized (body, etag) for key, serializing build() on the first request."""
+
+		entry = self._bodies.get(key)
+		if entry:
+			return entry
+
+		# under the reload lock, so the body and the map it is stored in belong to the same generation of orders
+		with self._lock:
+			if key not in self._bodies:
+				body = (current_app.json.dumps(build()) + '\n').encode('utf8')
+				self._bodies[key] = (body, hashlib.blake2b(body, digest_size=16).hexdigest())
+
+			return self._bodies[key]
+
+
+def with_image_url(item, url_root):
+	result = {key: value for key, value in item.items() if 'art_png' != key}
+	result['image'] = f"{url_root}images/{item['art_png']}"
+	return result
+
+
+def cached_json_response(key, build):
+	body, etag = current_app.order_cache.body(key, build)
+
+	response = Response(body, mimetype='application/json')
+	response.set_etag(etag)
+	return response.make_conditional(request)
+
+
+def json_response(data):
+	body = (current_app.json.dumps(data) + '\n').encode('utf8')
+
+	response = Response(body, mimetype='application/json')
+	response.set_etag(hashlib.blake2b(body, digest_size=16).hexdigest())
+	return response.make_conditional(request)
+
+
+def streamed_json_response(items, url_root):
+	dumps = current_app.json.dumps
+
+	def generate():
+		# encode one item at a time so a full export never holds the whole body in memory
+		yield '['
+		for index, item in enumerate(items):
+			yield (',' if index else '') + dumps(with_image_url(item, url_root))
+		yield ']\n'
+
+	return Response(generate(), mimetype='application/json')
+
+
+def parse_int_argument(name, default=None, minimum=None, maximum=None):
+	value = request.args.get(name)
+	if value is None:
+		return default
+
+	try:
+		value = int(value)
+	except ValueError:
+		abort(400)
+
+	if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+		abort(400)
+
+	return value
+
+
+def query_response(index, key, legacy_items):
+	"""
+	Serves an index with ?limit=&after=<order_id> pagination and status, buyer_address and mosaic_id filters.
+	Without parameters the full list is served from the memoized body; ?stream=true streams the matches instead.
+	"""
+
+	url_root = request.url_root
+
+	filters = {name: request.args[name] for name in FILTER_PARAMETERS if name in request.args}
+	if 'mosaic_id' in filters:
+		filters['mosaic_id'] = normalize_mosaic_id(filters['mosaic_id'])
+
+	if request.args.get('stream') in ('1', 'true'):
+		# a stream has no page size limit, but honours after and an explicit limit
+		items, _ = index.query(filters, parse_int_argument('after'), parse_int_argument('limit', minimum=1))
+		return streamed_json_response(items, url_root)
+
+	if not filters and 'limit' not in request.args and 'after' not in request.args:
+		return cached_json_response((key, url_root), lambda: [with_image_url(item, url_root) for item in legacy_items()])
+
+	after = parse_int_argument('after')
+	limit = parse_int_argument('limit', DEFAULT_PAGE_LIMIT, 1, MAX_PAGE_LIMIT)
+
+	items, has_more = index.query(filters, after, limit)
+	return json_response({
+		'data': [with_image_url(item, url_root) for item in items],
+		'next': items[-1]['order_id'] if has_more else None
+	})
+
 
 def create_app():
 	app = Flask(__name__)
 
 	CORS(app)
 
+	app.order_cache = OrderCache(Order_FILE)
+	app.image_variants = ImageVariantCache(IMAGES_FOLDER, IMAGE_VARIANT_FOLDER, IMAGE_VARIANT_CACHE_BYTES)
+	app.render_cache = RenderCache(ART_SOURCE, RENDER_CACHE_FOLDER, max_disk_bytes=RENDER_CACHE_BYTES)
+
 	setup_error_handlers(app)
 
 	setup_routes(app)
@@ -20,47 +262,70 @@ def create_app():
 def setup_routes(app):
 	@app.route('/api/orders', methods=['GET'])
 	def get_orders():
-		url_root = request.url_root
+		order_cache = app.order_cache
+		order_cache.refresh()
 
-		with open(Order_FILE) as order_file:
-			orders = json.load(order_file)
-
-		for order in orders:
-			art_png = order['message'].replace(',', '_') + '.png'
-
-			order['image'] = f"{url_root}images/{art_png}"
-
-		return jsonify(orders)
+		return query_response(order_cache.order_index, 'orders', lambda: order_cache.orders)
 
 	@app.route('/api/mosaics', methods=['GET'])
 	def get_mosaics():
-		url_root = request.url_root
+		order_cache = app.order_cache
+		order_cache.refresh()
 
-		with open(Order_FILE) as order_file:
-			orders = json.load(order_file)
+		return query_response(order_cache.mosaic_index, 'mosaics', lambda: order_cache.mosaics)
 
-		mosaics = []
+	@app.route('/api/render/stats', methods=['GET'])
+	def get_render_stats():
+		return jsonify(app.render_cache.stats())
 
-		for order in orders:
-			if order["order_status"] == 'completed':
-				art_png = order['message'].replace(',', '_') + '.png'
-				mosaics.append({
-					"image": f"{url_root}images/{art_png}",
-					"mosaic_id": order['mosaic_id'].replace('0x', '').upper(),
-					"mosaic_supply": order['mosaic_supply'],
-					"order_id": order['order_id'],
-					"buyer_address": order['buyer_address'],
-					"image_container_hash": order['image_container_hash'],
-				})
+	@app.route('/api/render/<trait_code>', methods=['GET'])
+	def render_art(trait_code):
+		# trait code uses the order message format, e.g. /api/render/1,1,1,1,1,1
+		try:
+			image_bytes, source = app.render_cache.render(trait_code)
+		except InvalidTraitCode:
+			abort(400)
 
-		return jsonify(mosaics)
+		response = Response(image_bytes, mimetype='image/png')
+		response.set_etag(hashlib.blake2b(image_bytes, digest_size=16).hexdigest())
+		response.cache_control.public = True
+		response.cache_control.max_age = IMAGE_VARIANT_MAX_AGE
+		response.headers['X-Render-Source'] = source
+		return response.make_conditional(request)
 
 	@app.route('/images/<filename>', methods=['GET'])
 	def get_image(filename):
-		return send_from_directory(IMAGES_FOLDER, filename)
+		image_variants = app.image_variants
+
+		# ?w= selects a thumbnail width, WebP is served to clients listing it, */* alone keeps the original PNG
+		width = image_variants.variant_width(parse_int_argument('w', minimum=1))
+		accepts_webp = any('image/webp' == mimetype and quality > 0 for mimetype, quality in request.accept_mimetypes)
+		use_webp = accepts_webp and image_variants.webp_supported()
+
+		if width is None and not use_webp:
+			response = send_from_directory(IMAGES_FOLDER, filename)
+		else:
+			variant = image_variants.variant(filename, width, 'webp' if use_webp else 'png')
+			if not variant:
+				abort(404)
+
+			variant_path, mimetype = variant
+			response = send_file(variant_path, mimetype=mimetype, max_age=IMAGE_VARIANT_MAX_AGE, conditional=True, etag=True)
+			response.cache_control.public = True
+
+		response.vary.add('Accept')
+		return response
 
 
 def setup_error_handlers(app):
+	@app.errorhandler(400)
+	def bad_request(_):
+		response = {
+			'status': 400,
+			'message': 'Invalid request parameters'
+		}
+		return jsonify(response), 400
+
 	@app.errorhandler(404)
 	def not_found(_):
 		response = {
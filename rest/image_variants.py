@@ -0,0 +1,128 @@
+import fcntl
+import os
+import threading
+
+from PIL import Image, features
+from werkzeug.security import safe_join
+
+# requested widths are rounded up to one of these so the number of variants per image stays bounded
+VARIANT_WIDTHS = (32, 64, 128, 192)
+
+VARIANT_FORMATS = {
+	'png': ('PNG', 'image/png', {'optimize': True}),
+	'webp': ('WEBP', 'image/webp', {'quality': 85, 'method': 6})
+}
+
+
+class ImageVariantCache:
+	"""On-disk cache of resized and re-encoded generated images, bounded in bytes with least recently used eviction."""
+
+	def __init__(self, source_folder, cache_folder, max_bytes=256 * 1024 * 1024):
+		self.source_folder = source_folder
+		self.cache_folder = cache_folder
+		self.max_bytes = max_bytes
+		self.renders = 0
+		self._locks = [threading.Lock() for _ in range(64)]
+
+	@staticmethod
+	def variant_width(width):
+		"""Rounds a requested width up to a supported variant width, None when the full size should be used."""
+
+		if width is None:
+			return None
+
+		return next((variant_width for variant_width in VARIANT_WIDTHS if width <= variant_width), None)
+
+	@staticmethod
+	def webp_supported():
+		return features.check('webp')
+
+	def _lock(self, key):
+		return self._locks[hash(key) % len(self._locks)]
+
+	def variant(self, filename, width, image_format):
+		"""
+		Returns (path, mimetype) of the variant of filename with the given width and format, rendering it on first use.
+		Returns None when the source image does not exist.
+		"""
+
+		source_path = safe_join(self.source_folder, filename)
+		if not source_path or not os.path.isfile(source_path):
+			return None
+
+		_, mimetype, _ = VARIANT_FORMATS[image_format]
+
+		# the source mtime is part of the name so a regenerated image never serves a stale variant
+		stem, _ = os.path.splitext(filename)
+		source_version = os.stat(source_path).st_mtime_ns
+		variant_name = f'{stem}.{width or "full"}.{source_version}.{image_format}'
+		variant_path = os.path.join(self.cache_folder, variant_name)
+
+		try:
+			os.utime(variant_path)  # mark as recently used for eviction
+			return variant_path, mimetype
+		except FileNotFoundError:
+			pass
+
+		# threads of this worker wait on the lock, other workers on the lock file, so each variant is rendered once
+		with self._lock(variant_name):
+			os.makedirs(self.cache_folder, exist_ok=True)
+			with open(f'{variant_path}.lock', 'w') as lock_file:
+				fcntl.flock(lock_file, fcntl.LOCK_EX)
+				try:
+					if not os.path.exists(variant_path):
+						self._render(source_path, variant_path, width, image_format)
+				finally:
+					fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+			try:
+				os.remove(f'{variant_path}.lock')
+			except FileNotFoundError:
+				pass
+
+		self.evict(keep=variant_path)
+		return variant_path, mimetype
+
+	def _render(self, source_path, variant_path, width, image_format):
+		pil_format, _, save_options = VARIANT_FORMATS[image_format]
+
+		with Image.open(source_path) as image:
+			if width and width < image.width:
+				image = image.resize((width, round(image.height * width / image.width)), Image.Resampling.LANCZOS)
+
+			temporary_path = f'{variant_path}.{os.getpid()}.tmp'
+			image.save(temporary_path, format=pil_format, **save_options)
+
+		os.replace(temporary_path, variant_path)
+		self.renders += 1
+
+	def evict(self, keep=None):
+		"""Deletes the least recently used variants, except keep, until the cache fits in max_bytes."""
+
+		evict_least_recently_used(self.cache_folder, self.max_bytes, keep)
+
+
+def evict_least_recently_used(folder, max_bytes, keep=None):
+	"""Deletes the files of folder with the oldest mtime, except keep, until the folder fits in max_bytes."""
+
+	entries = []
+	total_bytes = 0
+	with os.scandir(folder) as scanned_entries:
+		for entry in scanned_entries:
+			if entry.name.endswith(('.lock', '.tmp')) or entry.path == keep:
+				continue
+
+			stat = entry.stat()
+			entries.append((stat.st_mtime, stat.st_size, entry.path))
+			total_bytes += stat.st_size
+
+	for _, size, path in sorted(entries):
+		if total_bytes <= max_bytes:
+			break
+
+		try:
+			os.remove(path)
+		except FileNotFoundError:
+			pass
+
+		total_bytes -= size
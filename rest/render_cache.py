@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from generator import LayerCache, art_layers, render_image_bytes
+from rest.image_variants import evict_least_recently_used
+
+
+class InvalidTraitCode(ValueError):
+	"""Raised when a trait code is malformed or names a layer missing from art source."""
+
+
+class RenderCache:
+	"""Renders trait codes on demand, keeping the encoded PNGs in a bounded memory LRU backed by a bounded disk cache."""
+
+	def __init__(self, art_source, cache_folder, max_memory_bytes=32 * 1024 * 1024, max_disk_bytes=256 * 1024 * 1024):
+		self.art_source = art_source
+		self.cache_folder = cache_folder
+		self.max_memory_bytes = max_memory_bytes
+		self.max_disk_bytes = max_disk_bytes
+
+		self._images = OrderedDict()
+		self._memory_bytes = 0
+		self._lock = threading.Lock()
+		self._render_locks = [threading.Lock() for _ in range(64)]
+
+		# decoded layers of the request threads, kept apart from the renders of the workflows
+		self.layer_cache = LayerCache()
+
+		self.hits = {'memory': 0, 'disk': 0, 'render': 0}
+		self.render_seconds = deque(maxlen=1024)
+
+	@staticmethod
+	def normalize(trait_code):
+		"""Returns the six values of a trait code in the order message format (1,1,1,1,1,1), so 01 and 1 are one code."""
+
+		values = trait_code.split(',')
+		# isdigit alone accepts digits int() rejects, such as superscripts
+		if 6 != len(values) or not all(value.isascii() and value.isdecimal() for value in values):
+			raise InvalidTraitCode(f'trait code must be six comma separated numbers: {trait_code}')
+
+		return [int(value) for value in values]
+
+	def layers(self, values):
+		"""Returns the layers of normalized trait code values in stacking order, checking they all exist."""
+
+		# same 0-based message values and layer order as process_order
+		layers = art_layers([value + 1 for value in values], self.art_source)
+
+		missing = [layer for layer in layers if not os.path.isfile(layer)]
+		if missing:
+			trait_code = ','.join(str(value) for value in values)
+			raise InvalidTraitCode(f'trait code {trait_code} uses missing layers: {", ".join(missing)}')
+
+		return layers
+
+	def _remember(self, key, image_bytes):
+		with self._lock:
+			if key in self._images:
+				return
+
+			self._images[key] = image_bytes
+			self._memory_bytes += len(image_bytes)
+
+			while self._memory_bytes > self.max_memory_bytes and len(self._images) > 1:
+				_, evicted = self._images.popitem(last=False)
+				self._memory_bytes -= len(evicted)
+
+	def _from_memory(self, key):
+		with self._lock:
+			image_bytes = self._images.get(key)
+			if image_bytes is not None:
+				self._images.move_to_end(key)
+
+			return image_bytes
+
+	def _count_hit(self, source):
+		with self._lock:
+			self.hits[source] += 1
+
+	def _from_disk(self, path):
+		try:
+			with open(path, 'rb') as file:
+				image_bytes = file.read()
+		except FileNotFoundError:
+			return None
+
+		os.utime(path)  # mark as recently used for eviction
+		return image_bytes
+
+	def render(self, trait_code):
+		"""Returns (png bytes, source) for a trait code, where source is memory, disk or render."""
+
+		values = self.normalize(trait_code)
+		layers = self.layers(values)
+		key = '_'.join(str(value) for value in values)
+		path = os.path.join(self.cache_folder, f'{key}.png')
+
+		image_bytes = self._from_memory(key)
+		if image_bytes is not None:
+			self._count_hit('memory')
+			return image_bytes, 'memory'
+
+		# concurrent requests for the same code wait for a single render
+		with self._render_locks[hash(key) % len(self._render_locks)]:
+			source = 'disk'
+			image_bytes = self._from_disk(path)
+
+			if image_bytes is None:
+				source = 'render'
+				start = time.perf_counter()
+				image_bytes = render_image_bytes(layers, cache=self.layer_cache)
+				self.render_seconds.append(time.perf_counter() - start)
+
+				os.makedirs(self.cache_folder, exist_ok=True)
+				temporary_path = f'{path}.{os.getpid()}.tmp'
+				with open(temporary_path, 'wb') as file:
+					file.write(image_bytes)
+
+				os.replace(temporary_path, path)
+				evict_least_recently_used(self.cache_folder, self.max_disk_bytes, keep=path)
+
+			self._remember(key, image_bytes)
+
+		self._count_hit(source)
+		return image_bytes, source
+
+	def stats(self):
+		render_seconds = sorted(self.render_seconds)
+
+		def percentile(fraction):
+			return render_seconds[min(len(render_seconds) - 1, int(fraction * len(render_seconds)))] if render_seconds else None
+
+		return {
+			'hits': dict(self.hits),
+			'memory_entries': len(self._images),
+			'memory_bytes': self._memory_bytes,
+			'layer_cache': self.layer_cache.stats(),
+			'cold_render_seconds': {
+				'count': len(render_seconds),
+				'p50': percentile(0.5),
+				'p95': percentile(0.95),
+				'max': render_seconds[-1] if render_seconds else None
+			}
+		}
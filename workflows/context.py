@@ -0,0 +1,184 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from symbolchain.CryptoTypes import PrivateKey, PublicKey
+from symbolchain.facade.SymbolFacade import SymbolFacade
+
+from client.NodeMetadataCache import NodeMetadataCache
+from Metrics import METRICS
+from client.SymbolClient import SymbolClient
+from order.ConfirmationTracker import ConfirmationTracker
+from order.ImageIndex import ImageIndex
+from order.OrderManager import OrderManager
+from order.UploadRetries import UploadRetries
+from TomatoProcess import NFT_STORAGE_PUBLIC_KEY, TomatoProcess
+from workflows.profiling import PROFILE_MODES, WorkflowProfiler
+
+
+def add_common_arguments(parser):
+	parser.add_argument('--symbol-node', help='Symbol node url, or comma separated urls of a node pool', default='http://wolf.importance.jp:3000')
+	parser.add_argument('--hedge-after', help='seconds before a slow read is duplicated to the next node', type=float)
+	parser.add_argument('--announce-fanout', help='number of nodes each transaction is announced to', type=int, default=2)
+	parser.add_argument('--requests-per-second', help='requests per second sent to each node, unlimited by default', type=float)
+	parser.add_argument('--max-retries', help='retries of a request failing with 429, 5xx or a connection error', type=int, default=3)
+	parser.add_argument('--network', help='NEM and Symbol network', choices=['testnet', 'mainnet'], default='mainnet')
+	parser.add_argument('--order-address', help='address receive order transaction')
+	parser.add_argument('--private-key', help='private key of the account to use for NFT creation')
+	parser.add_argument('--order-file', help='path to save order file', default='data/order.json')
+	parser.add_argument('--node-cache-file', help='cache of node metadata shared between runs', default='data/node_metadata.json')
+	parser.add_argument('--image-index-file', help='index of the images confirmed on chain, reused by repeat orders', default='data/image_index.json')
+	parser.add_argument('--metrics-file', help='file the metrics are written to after every run, .prom for Prometheus text, JSON otherwise')
+	parser.add_argument('--profile', help='profile the run for cpu time or memory allocations', choices=PROFILE_MODES)
+	parser.add_argument('--profile-folder', help='folder of the profile artifacts and summaries', default='data/profiles')
+	parser.add_argument('--profile-top', help='entries listed in the profile summary', type=int, default=25)
+	parser.add_argument('--dry-run', help='print transactions without sending', action='store_true')
+
+
+def create_client(args):
+	return SymbolClient(
+		args.symbol_node.split(','),
+		NodeMetadataCache(args.node_cache_file, scope=f'{args.network} {args.symbol_node}'),
+		hedge_after=args.hedge_after,
+		announce_fanout=args.announce_fanout,
+		requests_per_second=args.requests_per_second,
+		max_retries=args.max_retries)
+
+
+async def run_workflow(name, workflow, context):
+	"""Runs workflow(context) recording its duration and failures, then writes the metrics to --metrics-file when set."""
+
+	try:
+		with METRICS.time('workflow_run_seconds', workflow=name):
+			await workflow(context)
+	except Exception:
+		METRICS.increment('workflow_failures_total', workflow=name)
+		raise
+	finally:
+		if context.args.metrics_file:
+			METRICS.dump(context.args.metrics_file)
+
+
+def add_order_arguments(parser):
+	parser.add_argument('--check-point-file', help='check point file', default='data/last_check_point.json')
+	parser.add_argument('--art-generated-path', help='path to save image file', default='art_generated')
+	parser.add_argument('--page-size', help='incoming transactions fetched per request', type=int, default=100)
+	parser.add_argument('--render-workers', help='number of processes rendering images', type=int, default=os.cpu_count())
+	parser.add_argument('--optimize-png', help='upload the smallest lossless png encoding', action='store_true')
+	parser.add_argument('--announce-concurrency', help='maximum image chunk announces in flight', type=int, default=8)
+	parser.add_argument('--upload-retry-file', help='signed image chunks whose announce failed, by order', default='data/upload_retries.json')
+
+
+def add_confirmation_arguments(parser):
+	parser.add_argument('--confirmation-cache-file', help='cache of confirmed transaction hashes', default='data/confirmed_hashes.json')
+	parser.add_argument('--status-batch-size', help='maximum hashes per transaction status request', type=int, default=100)
+	parser.add_argument('--safety-poll-interval', help='seconds between polls while confirmations arrive on the websocket', type=float, default=300)
+
+
+class WorkflowContext:
+	"""Client, signing key, order store and transaction processing shared by the workflow stages of one process."""
+
+	def __init__(self, args, client, profiler=None):
+		self.args = args
+		self.client = client
+		self.profiler = profiler or WorkflowProfiler()
+		self.facade = SymbolFacade(args.network)
+		self.key_pair = self.facade.KeyPair(PrivateKey(args.private_key))
+		self.order_manager = OrderManager(args.order_file)
+
+		self._tomato_process = None
+		self._confirmation_tracker = None
+		self._image_index = None
+		self._render_executor = None
+		self._upload_retries = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+	def close(self):
+		"""Stops the worker processes started for this context and saves pending confirmations."""
+
+		if self._confirmation_tracker:
+			self._confirmation_tracker.flush()
+
+		if self._tomato_process:
+			self._tomato_process.close()
+
+		if self._render_executor:
+			self._render_executor.shutdown()
+			self._render_executor = None
+
+	@property
+	def confirmation_tracker(self):
+		if not self._confirmation_tracker:
+			self._confirmation_tracker = ConfirmationTracker(
+				self.client,
+				self.args.confirmation_cache_file,
+				self.args.status_batch_size,
+				self.args.safety_poll_interval)
+
+		return self._confirmation_tracker
+
+	@property
+	def render_executor(self):
+		"""Render processes kept for the lifetime of the context, so each worker's LAYER_CACHE stays warm between pages."""
+
+		if not self._render_executor:
+			self._render_executor = ProcessPoolExecutor(self.args.render_workers)
+
+		return self._render_executor
+
+	@property
+	def image_index(self):
+		if not self._image_index:
+			storage_address = self.facade.network.public_key_to_address(PublicKey(NFT_STORAGE_PUBLIC_KEY))
+			self._image_index = ImageIndex(self.args.image_index_file, scope=f'{self.args.network} {storage_address}')
+
+		return self._image_index
+
+	@property
+	def upload_retries(self):
+		if not self._upload_retries:
+			self._upload_retries = UploadRetries(self.args.upload_retry_file)
+
+		return self._upload_retries
+
+	def record_failed_orders(self, orders, order_hashes):
+		"""Stores failed_transactions on orders whose transactions the node rejected; they stay pending for an operator."""
+
+		failed_orders = self.confirmation_tracker.failed_orders(orders, order_hashes)
+		updates = {
+			order['order_id']: {'failed_transactions': failed_orders[order['order_id']]}
+			for order in orders
+			if order['order_id'] in failed_orders and failed_orders[order['order_id']] != order.get('failed_transactions')
+		}
+
+		for order_id, update in updates.items():
+			print(f'order {order_id}: transactions failed: {update["failed_transactions"]}')
+
+		if updates:
+			self.order_manager.update_orders(updates)
+
+	async def deadline(self):
+		network_time = await self.client.node_time()
+		return network_time.add_hours(2)
+
+	async def tomato_process(self):
+		"""
+		Returns a TomatoProcess signing with the current median fee multiplier, for one stage run.
+		It shares the engine and recorded fees of the process, the multiplier is never changed under a running stage.
+		"""
+
+		median_fee_multiplier = await self.client.median_fee_multiplier()
+
+		if not self._tomato_process:
+			self._tomato_process = TomatoProcess(
+				self.client,
+				self.args.network,
+				self.key_pair,
+				median_fee_multiplier,
+				getattr(self.args, 'announce_concurrency', 1))
+
+		return self._tomato_process.with_fee_multiplier(median_fee_multiplier)
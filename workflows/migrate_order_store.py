@@ -0,0 +1,21 @@
+import argparse
+
+from order.OrderStore import SqliteOrderStore
+
+
+def main():
+	parser = argparse.ArgumentParser(description='migrate a json order file into a sqlite order store')
+	parser.add_argument('--order-file', help='json order file to migrate', default='data/order.json')
+	parser.add_argument('--database', help='sqlite order store to create or update', default='data/order.db')
+
+	args = parser.parse_args()
+
+	store = SqliteOrderStore(args.database)
+	order_count = store.migrate_from_json(args.order_file)
+	store.close()
+
+	print(f'migrated {order_count} orders from {args.order_file} to {args.database}')
+	print(f'run the workflows with --order-file {args.database} to use it')
+
+if '__main__' == __name__:
+	main()
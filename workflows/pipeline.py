@@ -0,0 +1,86 @@
+import argparse
+import asyncio
+import signal
+
+from workflows.context import WorkflowContext, create_client, run_workflow, add_common_arguments, add_confirmation_arguments, add_order_arguments
+from workflows.process_image_container import process_image_containers
+from workflows.process_order import process_orders
+from workflows.process_settlement import process_settlements
+from workflows.profiling import WorkflowProfiler
+
+
+async def wait_any(events, timeout):
+	waiters = [asyncio.create_task(event.wait()) for event in events]
+	try:
+		await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+	finally:
+		for waiter in waiters:
+			waiter.cancel()
+
+
+async def run_stage(name, stage, context, interval, stop_event, wake_event=None):
+	"""
+	Runs stage every interval seconds, or as soon as wake_event is set, until stop_event is set.
+	A failed run is reported and retried next interval.
+	"""
+
+	while not stop_event.is_set():
+		if wake_event:
+			wake_event.clear()
+
+		try:
+			await run_workflow(name, stage, context)
+		except Exception as error:  # keep the other stages running
+			print(f'{name} stage failed: {error!r}')
+
+		await wait_any([stop_event] + ([wake_event] if wake_event else []), interval)
+
+	print(f'{name} stage stopped')
+
+
+async def main():
+	parser = argparse.ArgumentParser(description='run the tomatina order pipeline as one long-running process')
+	add_common_arguments(parser)
+	add_order_arguments(parser)
+	add_confirmation_arguments(parser)
+	parser.add_argument('--order-interval', help='seconds between checks for new orders', type=float, default=30)
+	parser.add_argument('--image-container-interval', help='seconds between image container runs', type=float, default=15)
+	parser.add_argument('--settlement-interval', help='seconds between settlement runs', type=float, default=15)
+	parser.add_argument('--no-websocket', help='poll for confirmations instead of listening on the node websocket', action='store_true')
+
+	args = parser.parse_args()
+
+	# SIGINT/SIGTERM let every stage finish its current run before exiting
+	stop_event = asyncio.Event()
+	loop = asyncio.get_running_loop()
+	for signal_number in (signal.SIGINT, signal.SIGTERM):
+		loop.add_signal_handler(signal_number, stop_event.set)
+
+	# one profiler covers the whole process, profilers of concurrent stages would replace each other
+	with WorkflowProfiler.from_args(args, 'pipeline') as profiler:
+		async with create_client(args) as client:
+			with WorkflowContext(args, client, profiler) as context:
+				confirmation_tracker = context.confirmation_tracker
+
+				# confirmations pushed by the node wake the follow-up stages instead of waiting for their interval
+				image_container_wake = confirmation_tracker.add_listener()
+				settlement_wake = confirmation_tracker.add_listener()
+				if not args.no_websocket:
+					confirmation_tracker.start_listening(context.facade.network.public_key_to_address(context.key_pair.public_key))
+
+				try:
+					await asyncio.gather(
+						run_stage('order', process_orders, context, args.order_interval, stop_event),
+						run_stage(
+							'image container',
+							process_image_containers,
+							context,
+							args.image_container_interval,
+							stop_event,
+							image_container_wake),
+						run_stage('settlement', process_settlements, context, args.settlement_interval, stop_event, settlement_wake))
+				finally:
+					await confirmation_tracker.stop_listening()
+
+if '__main__' == __name__:
+	asyncio.run(main())
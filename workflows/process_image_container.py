@@ -2,34 +2,18 @@ import argparse
 import asyncio
 import yaml
 
-from client.SymbolClient import SymbolClient
-from symbolchain.CryptoTypes import PrivateKey
-from symbolchain.facade.SymbolFacade import SymbolFacade
+from Metrics import METRICS
+from order.OrderManager import OrderStatus
+from workflows.profiling import WorkflowProfiler
+from workflows.context import WorkflowContext, create_client, run_workflow, add_common_arguments, add_confirmation_arguments
 
-from order.OrderManager import OrderManager, OrderStatus
-from TomatoProcess import TomatoProcess
 
-
-async def main():
-	parser = argparse.ArgumentParser(description='process tomation nft order')
-	parser.add_argument('--symbol-node', help='Symbol node url', default='http://wolf.importance.jp:3000')
-	parser.add_argument('--network', help='NEM and Symbol network', choices=['testnet', 'mainnet'], default='mainnet')
-	parser.add_argument('--order-address', help='address receive order transaction')
-	parser.add_argument('--private-key', help='private key of the account to use for NFT creation')
-	parser.add_argument('--order-file', help='path to save order file', default='data/order.json')
-	parser.add_argument('--dry-run', help='print transactions without sending', action='store_true')
-
-	args = parser.parse_args()
-
-	client = SymbolClient(args.symbol_node)
-	facade = SymbolFacade(args.network)
-
-	private_key = PrivateKey(args.private_key)
-	key_pair = facade.KeyPair(private_key)
+async def process_image_containers(context):
+	args = context.args
 
 	print('processing image container')
 
-	order_manager = OrderManager(args.order_file)
+	order_manager = context.order_manager
 
 	pending = order_manager.get_pending_image_mosaic_orders()
 
@@ -39,26 +23,9 @@ async def main():
 
 	print(f'found {len(pending)} pending image container')
 
-	confirmed_orders = []
-
-	for order in pending:
-		order_id = order['order_id']
-		image_hash = order['image_hash']
-		mosaic_hash = order['mosaic_hash']
-
-		txes = image_hash + [mosaic_hash]
-
-		payload = {"hashes": txes}
-
-		client_response = await client.transaction_statuses(payload)
-
-		if 0 == len(client_response) or len(txes) != len(client_response):
-			continue
-
-		all_confirmed = all(status['group'] == 'confirmed' for status in client_response)
-
-		if all_confirmed:
-			confirmed_orders.append(order_id)
+	order_hashes = lambda order: order['image_hash'] + [order['mosaic_hash']]
+	confirmed_orders = await context.confirmation_tracker.confirmed_orders(pending, order_hashes)
+	context.record_failed_orders(pending, order_hashes)
 
 	if len(confirmed_orders) == 0:
 		print('image container have not confirm yet')
@@ -66,15 +33,19 @@ async def main():
 	else:
 		print(f'found {len(confirmed_orders)} image container confirmed')
 
-	network_time = await client.node_time()
-	network_time = network_time.add_hours(2)
+	network_time = await context.deadline()
 
-	median_fee_multiplier = await client.median_fee_multiplier()
+	tomato_process = await context.tomato_process()
 
-	tomato_process = TomatoProcess(client, args.network, key_pair, median_fee_multiplier)
+	image_index = context.image_index
 
 	for order_id in confirmed_orders:
 		order_info = order_manager.get_order(order_id)
+
+		# the chunks are confirmed now, so later orders of the same image can point their container at them
+		if order_info.get('image_digest') and not order_info.get('image_reused_from'):
+			image_index.add(order_info['image_digest'], order_info['image_hash'], order_info['image_size'], order_id)
+
 		garush_meta = {
 			'type': 'garush',
 			'version': 1,
@@ -95,11 +66,26 @@ async def main():
 
 		order_manager.update_order(order_id, {
 			'image_container_hash': image_container_hash,
+			'transaction_fees': {**order_info.get('transaction_fees', {}), **tomato_process.recorded_fees([image_container_hash])},
+			'lifecycle': METRICS.order_event(order_info, 'image_container', 'minted'),
 			"order_status": OrderStatus.PENDING_SETTLEMENT
 		})
 
 		print(f'processed order: {order_id}')
 		print(f'image_container_hash: {image_container_hash}')
 
+
+async def main():
+	parser = argparse.ArgumentParser(description='process tomation nft order')
+	add_common_arguments(parser)
+	add_confirmation_arguments(parser)
+
+	args = parser.parse_args()
+
+	with WorkflowProfiler.from_args(args, 'process_image_container') as profiler:
+		async with create_client(args) as client:
+			with WorkflowContext(args, client, profiler) as context:
+				await run_workflow('image container', process_image_containers, context)
+
 if '__main__' == __name__:
 	asyncio.run(main())
@@ -1,64 +1,56 @@
 import argparse
 import asyncio
-import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 from binascii import unhexlify
-from client.SymbolClient import SymbolClient
-from symbolchain.CryptoTypes import PrivateKey, PublicKey
-from symbolchain.facade.SymbolFacade import SymbolFacade
+from symbolchain.CryptoTypes import PublicKey
+from symbolchain.symbol.Network import NetworkTimestamp
 
 from order.CheckPoint import CheckPoint
-from order.OrderManager import OrderManager, OrderStatus
-from TomatoProcess import TomatoProcess
-from generator import generate_images_nft
+from order.ImageIndex import ImageIndex
+from order.OrderManager import OrderStatus
+from TomatoProcess import AnnounceError
+from workflows.profiling import WorkflowProfiler
+from workflows.context import WorkflowContext, create_client, run_workflow, add_common_arguments, add_order_arguments
+from generator import art_layers, parse_order_message, render_image_nft
+from Metrics import METRICS
 
 
-async def main():
-	parser = argparse.ArgumentParser(description='process tomation nft order')
-	parser.add_argument('--symbol-node', help='Symbol node url', default='http://wolf.importance.jp:3000')
-	parser.add_argument('--network', help='NEM and Symbol network', choices=['testnet', 'mainnet'], default='mainnet')
-	parser.add_argument('--order-address', help='address receive order transaction')
-	parser.add_argument('--private-key', help='private key of the account to use for NFT creation')
-	parser.add_argument('--check-point-file', help='check point file', default='data/last_check_point.json')
-	parser.add_argument('--order-file', help='order file', default='data/order.json')
-	parser.add_argument('--art-generated-path', help='path to save image file', default='art_generated')
-	parser.add_argument('--dry-run', help='print transactions without sending', action='store_true')
+async def render_images(render_jobs, executor):
+	if not render_jobs:
+		return []
 
-	args = parser.parse_args()
+	loop = asyncio.get_running_loop()
 
-	client = SymbolClient(args.symbol_node)
-	facade = SymbolFacade(args.network)
+	# gather keeps the results in job order
+	return await asyncio.gather(*[loop.run_in_executor(executor, render_image_nft, job) for job in render_jobs])
 
-	private_key = PrivateKey(args.private_key)
-	key_pair = facade.KeyPair(private_key)
 
-	print(f'network: {args.network}')
+def received_time(transaction, facade, fetched_at):
+	"""Returns the unix time of the block confirming an order transfer, or fetched_at when the node omits it."""
 
-	print('Checking for new orders')
+	timestamp = transaction['meta'].get('timestamp')
+	if timestamp is None:
+		return fetched_at
 
-	currency_mosaic_id = await client.currency_mosaic_id()
+	return facade.network.to_datetime(NetworkTimestamp(int(timestamp))).timestamp()
 
-	native_mosaic_id = hex(currency_mosaic_id)[2:].upper()
-	order_payment = 70000000
 
-	check_point = CheckPoint(args.check_point_file)
-	last_check_point = check_point.get_last_check_point()
+def order_key(transaction):
+	"""Returns the key of an order transfer, transfers embedded in one aggregate share its hash and differ by index."""
 
-	if not last_check_point:
-		last_check_point = None
+	meta = transaction['meta']
+	if 'aggregateHash' in meta:
+		return f'{meta["aggregateHash"]}:{meta.get("index", 0)}'
 
-	transactions = await client.incoming_transfer_transactions(recipient_address=args.order_address, start_id=last_check_point)
+	return str(meta['hash'])
 
-	if (len(transactions) == 0):
-		print('No new order')
-		return
-
-	print(f'found {len(transactions)} transactions')
 
+def parse_orders(transactions, facade, native_mosaic_id, order_payment, fetched_at=None):
+	fetched_at = fetched_at or time.time()
 	orders = []
 
-	print(f'found {len(orders)} orders')
-
 	for transaction in transactions:
 		if 'message' not in transaction['transaction']:
 			continue
@@ -76,62 +68,100 @@ async def main():
 			hash_value = transaction['meta'].get('hash', transaction['meta'].get('aggregateHash', None))
 			print(f"New order: address: {buyer_address} tx: {hash_value}")
 
-			orders.append((unhexlify(message).decode('utf8').replace('\x00', ''), str(hash_value), str(buyer_address), int(mosaic['amount'])))
-
-	network_time =  await client.node_time()
-	network_time = network_time.add_hours(2)
-
-	median_fee_multiplier = await client.median_fee_multiplier()
-
-	tomato_process = TomatoProcess(client, args.network, key_pair, median_fee_multiplier)
-
-	order_manager = OrderManager(args.order_file)
+			orders.append((
+				unhexlify(message).decode('utf8').replace('\x00', ''),
+				str(hash_value),
+				str(buyer_address),
+				int(mosaic['amount']),
+				received_time(transaction, facade, fetched_at),
+				order_key(transaction)))
+
+	return orders
+
+
+async def mint_orders(
+	args,
+	tomato_process,
+	order_manager,
+	orders,
+	network_time,
+	profiler=None,
+	image_index=None,
+	render_executor=None,
+	upload_retries=None
+):
+	profiler = profiler or WorkflowProfiler()
+
+	# orders recorded by an earlier run that stopped before saving its check point are already minted
+	orders = [order for order in orders if not order_manager.has_order(order[1], order[5])]
+	METRICS.increment('orders_received_total', len(orders))
+
+	# render every new order's art in a process pool so PIL work does not block the event loop
+	render_jobs = []
+	mosaic_supplies = []
 
 	for order in orders:
-		mosaic_supply = 1
-		image_code = [1, 1, 1, 1, 1, 1]
-
-		if len(order[0].split(',')) == 6:
-			image_code = [int(x)+1 for x in order[0].split(',')]
-		elif len(order[0].split(',')) == 7:
-			image_code = [int(x)+1 for x in order[0].split(',')[:6]]
-			mosaic_supply = int(order[0].split(',')[6])
-
 		# message format example: 1,1,1,1,1,1,10
-		# image name format example: Arm Left_1.png (1-9)
-
-		arm_left = f'art_source/arm-left/Arm Left_{image_code[0]}.png'
-		arm_right = f'art_source/arm-right/Arm Right_{image_code[1]}.png'
-		body = f'art_source/body/body.png'
-		eyes = f'art_source/eyes/Eyes_{image_code[2]}.png'
-		feet = f'art_source/legs/feet_{image_code[3]}.png'
-		mouth = f'art_source/mouth/Mouth_{image_code[4]}.png'
-		stem = f'art_source/stem/stem_{image_code[5]}.png'
+		image_code, mosaic_supply = parse_order_message(order[0])
 
 		# generate image name: 1_1_1_1_1_1.png
 		output_filename = f'{args.art_generated_path}' + '/' +order[0].replace(',', '_') + '.png'
 
-		generate_images_nft([
-			feet,
-			body,
-			arm_left,
-			arm_right,
-			eyes,
-			mouth,
-			stem
-		], output_filename)
+		render_jobs.append((art_layers(image_code), output_filename, args.optimize_png))
+		mosaic_supplies.append(mosaic_supply)
+
+	with profiler.region('render'):
+		# tracemalloc only sees this process, so memory profiles render without the pool
+		if 'mem' == profiler.mode:
+			rendered_images = [render_image_nft(job) for job in render_jobs]
+		elif render_executor:
+			rendered_images = await render_images(render_jobs, render_executor)
+		else:
+			with ProcessPoolExecutor(args.render_workers) as executor:
+				rendered_images = await render_images(render_jobs, executor)
+
+	for order, mosaic_supply, (output_filename, image_bytes, timings) in zip(orders, mosaic_supplies, rendered_images):
+		image_size = len(image_bytes)
 
-		image_size = os.path.getsize(output_filename)
+		for stage, seconds in timings.items():
+			METRICS.observe('workflow_stage_seconds', seconds, stage=stage)
 
 		# create mosaic
 		create_mosaic_hash, mosaic_id = await tomato_process.create_mosaic(network_time, mosaic_supply, args.dry_run)
 
-		# upload image to chain
-		image_transaction_hash = await tomato_process.process_upload_to_chain(network_time, output_filename, args.dry_run)
-
-		order_manager.add_order({
+		# an image already confirmed on chain is not uploaded again, the new container points at the same chunks
+		image_digest = ImageIndex.digest(image_bytes)
+		indexed_image = image_index.get(image_digest) if image_index else None
+
+		order_status = OrderStatus.PENDING_IMAGE_CONTAINER
+		failed_payloads = {}
+
+		if indexed_image:
+			image_transaction_hash = indexed_image['image_hash']
+			image_reused_from = indexed_image['order_id']
+			METRICS.increment('image_uploads_total', result='reused')
+			METRICS.increment('image_upload_bytes_saved_total', image_size)
+			print(f'image {image_digest} already uploaded by order {image_reused_from}')
+		else:
+			# upload image to chain
+			with profiler.region('process_upload_to_chain'):
+				try:
+					image_transaction_hash = await tomato_process.process_upload_to_chain(network_time, image_bytes, args.dry_run)
+				except AnnounceError as error:
+					# the mosaic and part of the chunks are on chain, keep the order and announce the rest again later
+					image_transaction_hash = error.transaction_hashes
+					failed_payloads = error.failed_payloads
+					order_status = OrderStatus.PENDING_UPLOAD_RETRY
+					METRICS.increment('image_upload_failures_total')
+					print(f'order {order[1]}: {error}, will retry')
+
+			image_reused_from = None
+			METRICS.increment('image_uploads_total', result='uploaded')
+
+		order_id = order_manager.add_order({
 			"message": order[0],
 			"order_hash": order[1],
+			"order_key": order[5],
 			"buyer_address": order[2],
 			"paid": order[3],
 			"mosaic_hash": create_mosaic_hash,
@@ -139,12 +169,163 @@ async def main():
 			"mosaic_supply": mosaic_supply,
 			"image_hash": image_transaction_hash,
 			"image_size": image_size,
+			"image_digest": image_digest,
+			"image_reused_from": image_reused_from,
+			"transaction_fees": tomato_process.recorded_fees([create_mosaic_hash] + ([] if image_reused_from else image_transaction_hash)),
 			"image_container_hash": "",
 			"settlement_hash": "",
-			"order_status": OrderStatus.PENDING_IMAGE_CONTAINER
+			"lifecycle": METRICS.order_event({'lifecycle': {'received': order[4]}}, 'minted', 'received'),
+			"order_status": order_status
 		})
 
-	check_point.save_to_json({'last_offset_id': transactions[-1]["id"]})
+		# signed payloads are large, they stay out of the order document until they are announced
+		if failed_payloads:
+			upload_retries.set(order_id, network_time.timestamp, failed_payloads)
+
+
+async def resign_failed_chunks(args, tomato_process, order_info, failed_hashes, deadline):
+	"""Signs the failed chunk aggregates of an order again, returns the order update and the AnnounceError left, if any."""
+
+	# the rendered file holds the uploaded bytes, so planning it again gives the same chunks
+	with open(f'{args.art_generated_path}/' + order_info['message'].replace(',', '_') + '.png', 'rb') as file:
+		image_bytes = file.read()
+
+	image_hashes = list(order_info['image_hash'])
+	aggregate_indexes = [image_hashes.index(transaction_hash) for transaction_hash in failed_hashes]
+
+	error = None
+	try:
+		resigned_hashes = await tomato_process.resign_upload(deadline, image_bytes, aggregate_indexes, args.dry_run)
+	except AnnounceError as announce_error:
+		resigned_hashes = announce_error.transaction_hashes
+		error = announce_error
+
+	transaction_fees = dict(order_info['transaction_fees'])
+	for index, transaction_hash in zip(aggregate_indexes, resigned_hashes):
+		transaction_fees.pop(image_hashes[index], None)
+		image_hashes[index] = transaction_hash
+
+	transaction_fees.update(tomato_process.recorded_fees(resigned_hashes))
+	return {'image_hash': image_hashes, 'transaction_fees': transaction_fees}, error
+
+
+async def retry_uploads(args, tomato_process, order_manager, upload_retries, node_time):
+	deadline = node_time.add_hours(2)
+
+	for order_info in order_manager.get_pending_upload_retry_orders():
+		order_id = order_info['order_id']
+		retry = upload_retries.get(order_id)
+		if not retry:
+			print(f'order {order_id}: no failed announces recorded, needs a look from the operator')
+			continue
+
+		if node_time.timestamp < retry['deadline']:
+			update = {}
+			retry_deadline = retry['deadline']
+
+			error = None
+			try:
+				await tomato_process.retry_announces(retry['payloads'])
+			except AnnounceError as announce_error:
+				error = announce_error
+		else:
+			# the node rejects payloads past their deadline, their chunks are signed again with a new one
+			update, error = await resign_failed_chunks(args, tomato_process, order_info, retry['payloads'], deadline)
+			retry_deadline = deadline.timestamp
+
+		if error:
+			if update:
+				order_manager.update_order(order_id, update)
+
+			upload_retries.set(order_id, retry_deadline, error.failed_payloads)
+			print(f'order {order_id}: {error} again')
+			continue
+
+		order_manager.update_order(order_id, {**update, 'order_status': OrderStatus.PENDING_IMAGE_CONTAINER})
+		upload_retries.remove(order_id)
+		print(f'order {order_id}: image upload completed')
+
+
+async def process_orders(context):
+	args = context.args
+	client = context.client
+	facade = context.facade
+
+	print(f'network: {args.network}')
+
+	print('Checking for new orders')
+
+	currency_mosaic_id = await client.currency_mosaic_id()
+
+	native_mosaic_id = hex(currency_mosaic_id)[2:].upper()
+	order_payment = 70000000
+
+	check_point = CheckPoint(args.check_point_file)
+	last_check_point = check_point.get_last_check_point()
+
+	if not last_check_point:
+		last_check_point = None
+
+	order_manager = context.order_manager
+	tomato_process = None
+	transaction_count = 0
+
+	if order_manager.get_pending_upload_retry_orders():
+		tomato_process = await context.tomato_process()
+		await retry_uploads(args, tomato_process, order_manager, context.upload_retries, await client.node_time())
+
+	# only payments in the currency mosaic can be orders, so let the node drop everything else
+	pages = client.incoming_transfer_transaction_pages(
+		args.order_address,
+		start_id=last_check_point,
+		page_size=args.page_size,
+		transfer_mosaic_id=native_mosaic_id,
+		from_transfer_amount=order_payment)
+
+	async for transactions in pages:
+		fetched_at = time.time()
+		transaction_count += len(transactions)
+		print(f'found {len(transactions)} transactions')
+
+		orders = parse_orders(transactions, facade, native_mosaic_id, order_payment, fetched_at)
+
+		print(f'found {len(orders)} orders')
+
+		if orders:
+			# refreshed for every page so the deadline stays valid while a long backlog drains
+			network_time = await context.deadline()
+
+			if not tomato_process:
+				tomato_process = await context.tomato_process()
+
+			await mint_orders(
+				args,
+				tomato_process,
+				order_manager,
+				orders,
+				network_time,
+				context.profiler,
+				context.image_index,
+				context.render_executor,
+				context.upload_retries)
+
+		check_point.save_to_json({'last_offset_id': transactions[-1]["id"]})
+
+	if 0 == transaction_count:
+		print('No new order')
+
+
+async def main():
+	parser = argparse.ArgumentParser(description='process tomation nft order')
+	add_common_arguments(parser)
+	add_order_arguments(parser)
+
+	args = parser.parse_args()
+
+	with WorkflowProfiler.from_args(args, 'process_order') as profiler:
+		async with create_client(args) as client:
+			with WorkflowContext(args, client, profiler) as context:
+				await run_workflow('order', process_orders, context)
 
 if '__main__' == __name__:
 	asyncio.run(main())
@@ -2,36 +2,26 @@ import argparse
 import asyncio
 import json
 
-from client.SymbolClient import SymbolClient
-from symbolchain.CryptoTypes import PrivateKey
-from symbolchain.facade.SymbolFacade import SymbolFacade
+from Metrics import METRICS
+from order.OrderManager import OrderStatus
+from workflows.profiling import WorkflowProfiler
+from workflows.context import WorkflowContext, create_client, run_workflow, add_common_arguments, add_confirmation_arguments
 
-from order.OrderManager import OrderManager, OrderStatus
-from TomatoProcess import TomatoProcess
 
+def fee_transaction_hashes(order_info):
+	# transactions paid from the buyer's payment before settlement, a reused image was paid by the order that uploaded it
+	image_hashes = [] if order_info.get('image_reused_from') else order_info['image_hash']
+	return [order_info['mosaic_hash'], order_info['image_container_hash']] + image_hashes
 
-async def main():
-	parser = argparse.ArgumentParser(description='process tomation nft order')
-	parser.add_argument('--symbol-node', help='Symbol node url', default='http://wolf.importance.jp:3000')
-	parser.add_argument('--network', help='NEM and Symbol network', choices=['testnet', 'mainnet'], default='mainnet')
-	parser.add_argument('--order-address', help='address receive order transaction')
-	parser.add_argument('--private-key', help='private key of the account to use for NFT creation')
-	parser.add_argument('--order-file', help='path to save order file', default='data/order.json')
-	parser.add_argument('--dry-run', help='print transactions without sending', action='store_true')
-
-	args = parser.parse_args()
 
-	client = SymbolClient(args.symbol_node)
-	facade = SymbolFacade(args.network)
+async def process_settlements(context):
+	args = context.args
 
-	private_key = PrivateKey(args.private_key)
-	key_pair = facade.KeyPair(private_key)
-
-	native_mosaic_id = await client.currency_mosaic_id()
+	native_mosaic_id = await context.client.currency_mosaic_id()
 
 	print('processing settlement')
 
-	order_manager = OrderManager(args.order_file)
+	order_manager = context.order_manager
 
 	pending = order_manager.get_pending_settlement_orders()
 
@@ -41,23 +31,9 @@ async def main():
 
 	print(f'found {len(pending)} pending settlement')
 
-	confirmed_orders = []
-
-	for order in pending:
-		order_id = order['order_id']
-		image_container_hash = order['image_container_hash']
-
-		payload = {"hashes": [image_container_hash]}
-
-		client_response = await client.transaction_statuses(payload)
-
-		if 0 == len(client_response):
-			continue
-
-		all_confirmed = all(status['group'] == 'confirmed' for status in client_response)
-
-		if all_confirmed:
-			confirmed_orders.append(order_id)
+	order_hashes = lambda order: [order['image_container_hash']]
+	confirmed_orders = await context.confirmation_tracker.confirmed_orders(pending, order_hashes)
+	context.record_failed_orders(pending, order_hashes)
 
 	if len(confirmed_orders) == 0:
 		print('settlement have not confirm yet')
@@ -65,20 +41,27 @@ async def main():
 	else:
 		print(f'found {len(confirmed_orders)} settlement confirmed')
 
-	network_time = await client.node_time()
-	network_time = network_time.add_hours(2)
+	network_time = await context.deadline()
+
+	tomato_process = await context.tomato_process()
+	median_fee_multiplier = tomato_process.fee_multiplier
 
-	median_fee_multiplier = await client.median_fee_multiplier()
+	order_infos = [order_manager.get_order(order_id) for order_id in confirmed_orders]
 
-	tomato_process = TomatoProcess(client, args.network, key_pair, median_fee_multiplier)
+	# fees are recorded when signing; orders created before that are looked up in one batch
+	legacy_fee_hashes = [
+		transaction_hash
+		for order_info in order_infos
+		for transaction_hash in fee_transaction_hashes(order_info)
+		if transaction_hash not in order_info.get('transaction_fees', {})
+	]
+	looked_up_fees = await tomato_process.get_transaction_fees(legacy_fee_hashes) if legacy_fee_hashes else {}
 
-	for order_id in confirmed_orders:
-		order_info = order_manager.get_order(order_id)
+	for order_info in order_infos:
+		order_id = order_info['order_id']
 		paid_amount = order_info['paid']
 		nft_mosaic_id = int(order_info['mosaic_id'] , 16)  # convert hex to bytes
 		mosaic_supply = order_info['mosaic_supply']
-		mosaic_hash = order_info['mosaic_hash']
-		image_hash = order_info['image_hash']
 		image_container_hash = order_info['image_container_hash']
 		buyer_address = order_info['buyer_address']
 
@@ -88,7 +71,18 @@ async def main():
 		}
 
 		# total transaction fee = mosaic creation fee + mosaic_hash tx fee + image_hash tx fee
-		total_fee = await tomato_process.get_total_transaction_fees([mosaic_hash, image_container_hash] + image_hash)
+		transaction_fees = {**looked_up_fees, **order_info.get('transaction_fees', {})}
+
+		# counting an unknown fee as 0 would refund it to the buyer, the order is settled once every fee is known
+		missing_fee_hashes = [
+			transaction_hash for transaction_hash in fee_transaction_hashes(order_info) if transaction_hash not in transaction_fees
+		]
+		if missing_fee_hashes:
+			METRICS.increment('settlements_deferred_total')
+			print(f'order {order_id}: fee of {len(missing_fee_hashes)} transactions not found, settlement deferred')
+			continue
+
+		total_fee = sum(transaction_fees[transaction_hash] for transaction_hash in fee_transaction_hashes(order_info))
 
 		# mosaic creation fee
 		mosaic_creation_fee = 50000000
@@ -118,10 +112,32 @@ async def main():
 			buyer_address,
 			args.dry_run)
 
+		lifecycle = METRICS.order_event(order_info, 'settled', 'image_container')
+		if 'received' in lifecycle:
+			METRICS.observe('order_stage_seconds', lifecycle['settled'] - lifecycle['received'], stage='received_to_settled')
+
 		order_manager.update_order(order_id, {
 			'settlement_hash': transaction_hash,
+			'transaction_fees': {**order_info.get('transaction_fees', {}), **tomato_process.recorded_fees([transaction_hash])},
+			'lifecycle': lifecycle,
 			"order_status": OrderStatus.COMPLETED
 		})
 
+		# a completed order never asks for these confirmations again, its image chunks stay for orders reusing them
+		context.confirmation_tracker.forget([order_info['mosaic_hash'], order_info['image_container_hash']])
+
+
+async def main():
+	parser = argparse.ArgumentParser(description='process tomation nft order')
+	add_common_arguments(parser)
+	add_confirmation_arguments(parser)
+
+	args = parser.parse_args()
+
+	with WorkflowProfiler.from_args(args, 'process_settlement') as profiler:
+		async with create_client(args) as client:
+			with WorkflowContext(args, client, profiler) as context:
+				await run_workflow('settlement', process_settlements, context)
+
 if '__main__' == __name__:
 	asyncio.run(main())
@@ -0,0 +1,131 @@
+import cProfile
+import datetime
+import io
+import os
+import pstats
+import tracemalloc
+from contextlib import contextmanager
+
+PROFILE_MODES = ('cpu', 'mem')
+
+# allocations of tracemalloc itself and of module imports are noise in a workflow profile
+SNAPSHOT_FILTERS = (
+	tracemalloc.Filter(False, tracemalloc.__file__),
+	tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+	tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+	tracemalloc.Filter(False, '<unknown>')
+)
+
+
+def take_snapshot():
+	return tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+
+
+class WorkflowProfiler:
+	"""
+	Profiles one workflow run and writes a timestamped artifact plus a top-N summary to folder.
+
+	cpu wraps the run in cProfile (<name>-<time>.prof, readable with pstats); mem traces Python allocations with tracemalloc,
+	comparing snapshots around each region (<name>-<time>.snapshot, readable with tracemalloc.Snapshot.load).
+	Without a mode every method is a no-op.
+	"""
+
+	def __init__(self, mode=None, folder='data/profiles', name='workflow', top=25, frames=10):
+		self.mode = mode
+		self.folder = folder
+		self.name = name
+		self.top = top
+		self.frames = frames
+
+		self._profile = None
+		self._regions = {}
+		self._artifact_prefix = None
+
+	@classmethod
+	def from_args(cls, args, name):
+		return cls(args.profile, args.profile_folder, name, args.profile_top)
+
+	def __enter__(self):
+		started_at = datetime.datetime.now()
+		self._artifact_prefix = os.path.join(self.folder, f'{self.name}-{started_at:%Y%m%dT%H%M%S}')
+
+		if 'cpu' == self.mode:
+			self._profile = cProfile.Profile()
+			self._profile.enable()
+		elif 'mem' == self.mode:
+			tracemalloc.start(self.frames)
+
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		if 'cpu' == self.mode:
+			self._profile.disable()
+			self._write_cpu_profile()
+		elif 'mem' == self.mode:
+			snapshot = take_snapshot()
+			peak = tracemalloc.get_traced_memory()[1]
+			tracemalloc.stop()
+			self._write_memory_profile(snapshot, peak)
+
+	@contextmanager
+	def region(self, label):
+		"""In mem mode, records the peak and net allocations of the with block under label (regions must not nest)."""
+
+		if 'mem' != self.mode:
+			yield
+			return
+
+		before = take_snapshot()
+		tracemalloc.reset_peak()
+		start_size = tracemalloc.get_traced_memory()[0]
+		try:
+			yield
+		finally:
+			current_size, peak = tracemalloc.get_traced_memory()
+			statistics = take_snapshot().compare_to(before, 'lineno')
+
+			region = self._regions.setdefault(label, {'count': 0, 'net_bytes': 0, 'peak_bytes': 0, 'statistics': []})
+			region['count'] += 1
+			region['net_bytes'] += current_size - start_size
+
+			# the statistics of the run with the highest peak are kept
+			if peak - start_size >= region['peak_bytes']:
+				region['peak_bytes'] = peak - start_size
+				region['statistics'] = statistics[:self.top]
+
+	def _write_summary(self, summary):
+		summary_filename = f'{self._artifact_prefix}.txt'
+		with open(summary_filename, 'w') as file:
+			file.write(summary)
+
+		print(f'profile summary written to {summary_filename}')
+
+	def _write_cpu_profile(self):
+		os.makedirs(self.folder, exist_ok=True)
+		self._profile.dump_stats(f'{self._artifact_prefix}.prof')
+
+		with io.StringIO() as output:
+			stats = pstats.Stats(self._profile, stream=output)
+			for sort_key in ('cumulative', 'tottime'):
+				output.write(f'top {self.top} functions by {sort_key} time\n')
+				stats.sort_stats(sort_key).print_stats(self.top)
+
+			self._write_summary(output.getvalue())
+
+	def _write_memory_profile(self, snapshot, peak):
+		os.makedirs(self.folder, exist_ok=True)
+		snapshot.dump(f'{self._artifact_prefix}.snapshot')
+
+		lines = [f'peak traced memory: {peak / 1024:.1f} KiB', '']
+
+		for label, region in self._regions.items():
+			lines.append(
+				f'{label}: {region["count"]} runs, peak {region["peak_bytes"] / 1024:.1f} KiB,'
+				f' net {region["net_bytes"] / 1024:.1f} KiB, top {self.top} allocation changes of the highest peak run:')
+			lines.extend(f'  {statistic}' for statistic in region['statistics'])
+			lines.append('')
+
+		lines.append(f'top {self.top} allocations still held at the end of the run:')
+		lines.extend(f'  {statistic}' for statistic in snapshot.statistics('lineno')[:self.top])
+
+		self._write_summary('\n'.join(lines) + '\n')